@@ -0,0 +1,304 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Микробенчмарк хелперов БД из tg_bot.py: ensure_user, create_participant,
+upsert_answer_field, get_participant, create_video_sequence_for_participant.
+
+База заполняется --rows участниками (users, participants, порядок видео и
+ответы на все 4 видео), после чего каждый хелпер вызывается --ops раз
+подряд для случайных существующих участников. В отчёте для каждого хелпера:
+операций в секунду, p50/p95/p99 и гистограмма задержек.
+
+Кэш состояния по умолчанию выключен, чтобы get_participant каждый раз шёл в БД
+(--with-cache включает BOT_STATE_CACHE_SIZE как есть). Остальные настройки
+берутся из переменных окружения BOT_*.
+
+Запуск:
+    python3 bench/db_bench.py --rows 100000 --output before.json
+    python3 bench/db_bench.py --rows 100000 --output after.json
+    python3 bench/db_bench.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+from latency import latency_histogram, latency_summary
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+HELPERS = (
+    "ensure_user",
+    "create_participant",
+    "upsert_answer_field",
+    "get_participant",
+    "create_video_sequence_for_participant",
+)
+
+SEED_CHUNK = 50_000
+
+
+def _chunks(start: int, stop: int, size: int = SEED_CHUNK) -> Iterator[range]:
+    for first in range(start, stop, size):
+        yield range(first, min(first + size, stop))
+
+
+async def seed(tg_bot, rows: int, first_user_id: int):
+    """Заполняет БД завершёнными участниками, если в ней их меньше rows."""
+    async with tg_bot._pool().reader() as db:
+        cur = await db.execute("SELECT COUNT(*) FROM participants")
+        (existing,) = await cur.fetchone()
+        await cur.close()
+    if existing >= rows:
+        print(f"В БД уже {existing} участников — заполнение пропущено", file=sys.stderr)
+        return
+
+    permutation = tg_bot.VIDEO_SEQUENCE_MODE == "permutation"
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for ids in _chunks(first_user_id + existing, first_user_id + rows):
+        users, participants, sequence, answers = [], [], [], []
+        for user_id in ids:
+            condition = rng.choice(tg_bot.VIDEO_CONDITIONS)
+            video_order = rng.randrange(len(tg_bot.SCENARIO_PERMUTATIONS))
+            users.append((user_id, f"user{user_id}", f"Участник {user_id}"))
+            participants.append(
+                (user_id, f"user{user_id}", f"Участник {user_id}", f"Псевдоним{user_id}",
+                 rng.choice(["Женский", "Мужской"]), rng.randint(18, 70), condition,
+                 4, 4, 1, video_order if permutation else None)
+            )
+            for position, video in enumerate(tg_bot.VIDEO_ORDER_TABLE[condition][video_order]):
+                if not permutation:
+                    sequence.append(
+                        (user_id, position, condition, video["scenario"], video["file_id"])
+                    )
+                answers.append(
+                    (user_id, position, video["scenario"], video["file_id"],
+                     "Робот показывает на предмет", "уверенно", "осознанно", rng.randint(1, 10))
+                )
+
+        async with tg_bot._pool().writer() as db:
+            await db.executemany(
+                "INSERT INTO users(user_id, tg_username, first_name) VALUES (?, ?, ?)", users
+            )
+            await db.executemany(
+                """
+                INSERT INTO participants(
+                    user_id, tg_username, first_name, participant_name, gender, age,
+                    condition, current_video_idx, total_videos, completed, video_order
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                participants,
+            )
+            await db.executemany(
+                "INSERT INTO video_sequence(user_id, position, condition, scenario, file_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                sequence,
+            )
+            await db.executemany(
+                """
+                INSERT INTO answers(
+                    user_id, position, scenario, file_id,
+                    description, adv_behavior, adv_choice, scenario_rating
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                answers,
+            )
+            await db.commit()
+    print(
+        f"Заполнено {rows - existing} участников за {time.perf_counter() - started:.1f} с",
+        file=sys.stderr,
+    )
+
+
+def helper_calls(tg_bot, rng: random.Random, user_ids: range) -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """Один вызов каждого хелпера со случайными аргументами для существующего участника."""
+
+    def user() -> int:
+        return rng.choice(user_ids)
+
+    def ensure_user():
+        user_id = user()
+        return tg_bot.ensure_user(user_id, f"user{user_id}", f"Участник {user_id}")
+
+    def create_participant():
+        user_id = user()
+        return tg_bot.create_participant(
+            user_id, f"user{user_id}", f"Участник {user_id}", age=rng.randint(18, 70)
+        )
+
+    def upsert_answer_field():
+        scenario = rng.choice(tg_bot.SCENARIOS)
+        field = rng.choice(tg_bot.ANSWER_FIELDS)
+        value = rng.randint(1, 10) if field == "scenario_rating" else "быстро"
+        return tg_bot.upsert_answer_field(
+            user(), rng.randrange(4), scenario, tg_bot.VIDEO_FILES["с"][scenario], field, value
+        )
+
+    def get_participant():
+        return tg_bot.get_participant(user())
+
+    def create_video_sequence_for_participant():
+        return tg_bot.create_video_sequence_for_participant(
+            user(), rng.choice(tg_bot.VIDEO_CONDITIONS)
+        )
+
+    return {
+        "ensure_user": ensure_user,
+        "create_participant": create_participant,
+        "upsert_answer_field": upsert_answer_field,
+        "get_participant": get_participant,
+        "create_video_sequence_for_participant": create_video_sequence_for_participant,
+    }
+
+
+async def measure(call: Callable[[], Awaitable[Any]], ops: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        await call()
+
+    samples: List[float] = []
+    started = time.perf_counter()
+    for _ in range(ops):
+        t0 = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "ops": ops,
+        "ops_per_s": round(ops / elapsed, 1) if elapsed else 0.0,
+        "latency": latency_summary(samples),
+        "histogram_ms": latency_histogram(samples),
+    }
+
+
+async def run(args: argparse.Namespace, db_path: Path) -> Dict[str, Any]:
+    import tg_bot
+
+    await tg_bot.create_schema_and_fill(db_path)
+    await tg_bot.init_db_pool(db_path)
+    tg_bot.init_answer_buffer()
+    first_user_id = 1_000_000
+    try:
+        await seed(tg_bot, args.rows, first_user_id)
+
+        rng = random.Random(args.seed)
+        calls = helper_calls(tg_bot, rng, range(first_user_id, first_user_id + args.rows))
+        results = {}
+        for name in args.helpers:
+            results[name] = await measure(calls[name], args.ops, args.warmup)
+            print(f"{name}: {results[name]['ops_per_s']:.1f} оп/с", file=sys.stderr)
+    finally:
+        await tg_bot.close_answer_buffer()
+        await tg_bot.close_db_pool()
+
+    return {
+        "settings": {
+            "rows": args.rows,
+            "ops": args.ops,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "state_cache_size": tg_bot.STATE_CACHE_SIZE,
+            "answer_write_mode": tg_bot.ANSWER_WRITE_MODE,
+            "video_sequence_mode": tg_bot.VIDEO_SEQUENCE_MODE,
+            "db_pool_readers": tg_bot.DB_POOL_READERS,
+        },
+        "helpers": results,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'хелпер':40} {'оп/с':>10} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for name, result in report["helpers"].items():
+        lat = result["latency"]
+        print(
+            f"{name:40} {result['ops_per_s']:>10.1f} "
+            f"{lat['p50_ms']:>9.3f} {lat['p95_ms']:>9.3f} {lat['p99_ms']:>9.3f}"
+        )
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> Tuple[List[str], bool]:
+    """
+    Построчное сравнение двух отчётов. Регрессия — падение оп/с или рост p95
+    больше чем на threshold процентов.
+    """
+    lines = [f"{'хелпер':40} {'оп/с до':>10} {'оп/с после':>11} {'Δ':>8} {'p95 до':>9} {'p95 после':>10} {'Δ':>8}"]
+    regressed = False
+    names = list(before["helpers"]) + [n for n in after["helpers"] if n not in before["helpers"]]
+    for name in names:
+        a, b = before["helpers"].get(name), after["helpers"].get(name)
+        if a is None or b is None:
+            lines.append(f"{name:40} есть только в одном из отчётов")
+            continue
+        ops_change = _change(a["ops_per_s"], b["ops_per_s"])
+        p95_change = _change(a["latency"]["p95_ms"], b["latency"]["p95_ms"])
+        mark = ""
+        if ops_change < -threshold or p95_change > threshold:
+            mark = "  ← регрессия"
+            regressed = True
+        lines.append(
+            f"{name:40} {a['ops_per_s']:>10.1f} {b['ops_per_s']:>11.1f} {ops_change:>+7.1f}% "
+            f"{a['latency']['p95_ms']:>9.3f} {b['latency']['p95_ms']:>10.3f} {p95_change:>+7.1f}%{mark}"
+        )
+    if before["settings"] != after["settings"]:
+        lines.append(f"Внимание: настройки прогонов различаются: {before['settings']} / {after['settings']}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="число участников в БД (10 000 – 1 000 000)")
+    parser.add_argument("--ops", type=int, default=2000, help="вызовов каждого хелпера")
+    parser.add_argument("--warmup", type=int, default=100, help="вызовов для прогрева перед замером")
+    parser.add_argument("--helpers", nargs="+", choices=HELPERS, default=list(HELPERS), help="какие хелперы мерить")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора аргументов")
+    parser.add_argument("--with-cache", action="store_true", help="не выключать кэш состояния")
+    parser.add_argument("--db", type=Path, help="файл БД; уже заполненная база переиспользуется (по умолчанию — временная)")
+    parser.add_argument("--output", type=Path, help="сохранить отчёт JSON в файл")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BEFORE", "AFTER"), help="сравнить два сохранённых отчёта")
+    parser.add_argument("--threshold", type=float, default=10, help="порог регрессии для --compare, %%")
+    args = parser.parse_args()
+
+    if args.compare:
+        before, after = (json.loads(p.read_text(encoding="utf-8")) for p in args.compare)
+        lines, regressed = compare(before, after, args.threshold)
+        print("\n".join(lines))
+        sys.exit(1 if regressed else 0)
+
+    if not args.with_cache:
+        os.environ["BOT_STATE_CACHE_SIZE"] = "0"
+    os.environ["BOT_STATS_LOG_INTERVAL"] = "0"
+
+    # Лог бенчмарка — во временный каталог, а не в logs/bot.log рабочего бота
+    os.environ.setdefault("BOT_LOG_DIR", tempfile.mkdtemp(prefix="bot-bench-logs-"))
+    sys.path.insert(0, str(SRC_DIR))
+    import tg_bot  # noqa: F401 — настраивает логирование при импорте
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.db:
+        report = asyncio.run(run(args, args.db))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = asyncio.run(run(args, Path(tmp) / "db_bench.db"))
+
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
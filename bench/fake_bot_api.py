@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальная замена HTTP-клиента Telegram Bot API для нагрузочных тестов.
+
+FakeBotAPI подставляется в Application через builder.request(...): запросы
+никуда не уходят, на каждый метод возвращается правдоподобный ответ, а
+задержка сети имитируется через asyncio.sleep.
+
+flood_every=N имитирует лимит Telegram: каждый N-й запрос, адресованный чату,
+получает ответ 429 с retry_after=flood_retry_after секунд (RetryAfter в PTB).
+"""
+
+import asyncio
+import itertools
+import json
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+# Методы, которые в ответ возвращают отправленное сообщение
+_MESSAGE_METHODS = {"sendMessage", "sendVideo", "sendPhoto", "editMessageText", "editMessageCaption"}
+
+
+class FakeBotAPI(BaseRequest):
+    def __init__(self, latency_ms: float = 0.0, flood_every: int = 0, flood_retry_after: int = 1):
+        self.latency_ms = latency_ms
+        self.flood_every = flood_every
+        self.flood_retry_after = flood_retry_after
+        self.calls: Counter = Counter()
+        self.flood_responses = 0
+        self._message_ids = itertools.count(1)
+        self._chat_requests = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "Experiment bot",
+                "username": "experiment_bot",
+            }
+        if method in _MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id") or 0)
+            message: Dict[str, Any] = {
+                "message_id": next(self._message_ids),
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+            }
+            if "text" in params:
+                message["text"] = params["text"]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+            return message
+        return True
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Optional[float] = None,
+        write_timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        pool_timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        params = request_data.parameters if request_data else {}
+        if self.flood_every and "chat_id" in params:
+            self._chat_requests += 1
+            if self._chat_requests % self.flood_every == 0:
+                self.flood_responses += 1
+                payload = {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.flood_retry_after}",
+                    "parameters": {"retry_after": self.flood_retry_after},
+                }
+                return 429, json.dumps(payload).encode("utf-8")
+        payload = {"ok": True, "result": self._result(api_method, params)}
+        return 200, json.dumps(payload).encode("utf-8")
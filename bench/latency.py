@@ -0,0 +1,44 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Общие функции для отчётов нагрузочных тестов: перцентили и гистограммы задержек."""
+
+import bisect
+import math
+from typing import Dict, Sequence
+
+
+def percentile(sorted_samples: Sequence[float], p: float) -> float:
+    """Перцентиль p (0–100) по уже отсортированной выборке (метод nearest-rank)."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def latency_summary(samples_s: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/max и среднее в миллисекундах для выборки в секундах."""
+    ordered = sorted(samples_s)
+    if not ordered:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100)
+
+
+def latency_histogram(samples_s: Sequence[float], bounds_ms: Sequence[float] = HISTOGRAM_BOUNDS_MS) -> Dict[str, int]:
+    """Число замеров по корзинам «≤ граница, мс»; последняя корзина — всё, что больше."""
+    counts = [0] * (len(bounds_ms) + 1)
+    for sample in samples_s:
+        counts[bisect.bisect_left(bounds_ms, sample * 1000)] += 1
+    labels = [f"<={b:g}" for b in bounds_ms] + [f">{bounds_ms[-1]:g}"]
+    return dict(zip(labels, counts))
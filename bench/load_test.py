@@ -0,0 +1,232 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Офлайн нагрузочный тест: N виртуальных участников проходят весь сценарий
+(/start → имя → пол → возраст → 4 × (описание, два наречия, оценка Likert))
+через настоящие обработчики tg_bot.py, временную БД и локальную замену Bot API.
+
+Апдейты одного участника идут строго по очереди, разные участники — параллельно;
+одновременно обрабатывается не больше --workers апдейтов (как concurrent_updates
+у Application). В отчёте:
+- задержка обработчика (p50/p95/p99) в целом и по обработчикам,
+  и end-to-end задержка с учётом ожидания свободного обработчика;
+- пропускная способность, апдейтов в секунду;
+- обращения к пулу БД и SQL-запросы на апдейт, вызовы Bot API на апдейт.
+
+Настройки бота берутся из тех же переменных окружения BOT_*, ключи командной
+строки их перекрывают.
+
+Запуск:
+    python3 bench/load_test.py --participants 500 --api-latency-ms 40
+    python3 bench/load_test.py --participants 200 --write-mode group --max-p95-ms 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fake_bot_api import FakeBotAPI
+from latency import latency_summary
+from updates import generate_participants
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def handler_name(update: Dict[str, Any]) -> str:
+    """Какой обработчик бота получит апдейт из participant_script()."""
+    if "callback_query" in update:
+        data = update["callback_query"]["data"]
+        return "handle_gender_choice" if data.startswith("gender_") else "handle_likert"
+    if update["message"].get("text", "").startswith("/"):
+        return "start"
+    return "handle_text"
+
+
+def _pool_delta(before: Dict[str, Any], after: Dict[str, Any], updates: int) -> Dict[str, Any]:
+    def per_update(group: str, key: str) -> float:
+        return round((after[group][key] - before[group][key]) / updates, 3) if updates else 0.0
+
+    return {
+        "reader_acquisitions": per_update("reader", "acquisitions"),
+        "writer_acquisitions": per_update("writer", "acquisitions"),
+        "sql_statements": round(
+            per_update("reader", "statements") + per_update("writer", "statements"), 3
+        ),
+        "writer_wait_max_ms": after["writer"]["wait_max_ms"],
+        "reader_wait_max_ms": after["reader"]["wait_max_ms"],
+    }
+
+
+async def run(args: argparse.Namespace, db_path: Path) -> Dict[str, Any]:
+    import tg_bot
+    from telegram import Update
+
+    api = FakeBotAPI(latency_ms=args.api_latency_ms, flood_every=args.flood_every)
+
+    await tg_bot.create_schema_and_fill(db_path)
+    await tg_bot.init_db_pool(db_path)
+    tg_bot.init_answer_buffer()
+    app, _ = tg_bot.build_application("123456:LOAD-TEST", request=api)
+
+    errors: List[str] = []
+
+    async def count_error(update: object, context):
+        errors.append(repr(context.error))
+
+    app.add_error_handler(count_error)
+    await app.initialize()
+
+    per_user = generate_participants(args.participants)
+    total_updates = sum(len(updates) for updates in per_user.values())
+
+    handler_latency: Dict[str, List[float]] = defaultdict(list)
+    end_to_end: List[float] = []
+    workers = asyncio.Semaphore(max(1, args.workers))
+    walkers = asyncio.Semaphore(max(1, args.concurrency))
+
+    pool_before = tg_bot.db_pool.stats()
+    api.calls.clear()
+
+    async def walk(updates: List[Dict[str, Any]]):
+        async with walkers:
+            for raw in updates:
+                update = Update.de_json(raw, app.bot)
+                queued = time.perf_counter()
+                async with workers:
+                    started = time.perf_counter()
+                    await app.process_update(update)
+                    finished = time.perf_counter()
+                handler_latency[handler_name(raw)].append(finished - started)
+                end_to_end.append(finished - queued)
+                if args.think_ms:
+                    await asyncio.sleep(args.think_ms / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(walk(updates) for updates in per_user.values()))
+    elapsed = time.perf_counter() - started
+
+    pool_after = tg_bot.db_pool.stats()
+    api_calls = dict(api.calls)
+    send_queue = tg_bot.runtime_stats(app)["send_queue"]
+
+    await app.shutdown()
+    await tg_bot.close_answer_buffer()
+
+    async with tg_bot.db_pool.reader() as db:
+        cur = await db.execute("SELECT COUNT(*) FROM participants WHERE completed = 1")
+        (completed,) = await cur.fetchone()
+        await cur.close()
+    await tg_bot.close_db_pool()
+
+    all_handlers = [s for samples in handler_latency.values() for s in samples]
+    return {
+        "settings": {
+            "participants": args.participants,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "api_latency_ms": args.api_latency_ms,
+            "think_ms": args.think_ms,
+            "answer_write_mode": tg_bot.ANSWER_WRITE_MODE,
+            "video_sequence_mode": tg_bot.VIDEO_SEQUENCE_MODE,
+            "persistence": tg_bot.PERSISTENCE_MODE,
+            "db_pool_readers": tg_bot.DB_POOL_READERS,
+            "rate_limit": tg_bot.RATE_LIMIT,
+            "flood_every": args.flood_every,
+        },
+        "updates": total_updates,
+        "errors": len(errors),
+        "completed_participants": completed,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(total_updates / elapsed, 1) if elapsed else 0.0,
+        "latency": {
+            "handler": latency_summary(all_handlers),
+            "end_to_end": latency_summary(end_to_end),
+            "by_handler": {
+                name: latency_summary(samples) for name, samples in sorted(handler_latency.items())
+            },
+        },
+        "db_per_update": _pool_delta(pool_before, pool_after, total_updates),
+        "bot_api": {
+            "calls_per_update": round(sum(api_calls.values()) / total_updates, 3),
+            "by_method": api_calls,
+        },
+        "send_queue": send_queue,
+        "instrumentation": tg_bot.metrics.summary(),
+        "first_errors": errors[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=200, help="число виртуальных участников")
+    parser.add_argument("--concurrency", type=int, default=0, help="сколько участников проходят сценарий одновременно (0 — все)")
+    parser.add_argument("--workers", type=int, default=0, help="сколько апдейтов обрабатывается одновременно (0 — BOT_CONCURRENT_UPDATES)")
+    parser.add_argument("--api-latency-ms", type=float, default=30, help="имитация задержки ответа Bot API, мс")
+    parser.add_argument("--think-ms", type=float, default=0, help="пауза между шагами одного участника, мс")
+    parser.add_argument("--write-mode", help="BOT_ANSWER_WRITE_MODE: sync, group или lazy")
+    parser.add_argument("--sequence-mode", help="BOT_VIDEO_SEQUENCE_MODE: rows или permutation")
+    parser.add_argument("--persistence", help="BOT_PERSISTENCE: sqlite или none")
+    parser.add_argument(
+        "--rate-limit", default="off",
+        help="BOT_RATE_LIMIT: on или off (по умолчанию off — иначе тест мерил бы лимиты Telegram, а не бота)",
+    )
+    parser.add_argument("--flood-every", type=int, default=0, help="отвечать 429 на каждый N-й запрос в чат (проверка RetryAfter)")
+    parser.add_argument("--db", type=Path, help="файл БД (по умолчанию — временный, удаляется после теста)")
+    parser.add_argument("--max-p95-ms", type=float, help="завершиться с кодом 1, если p95 задержки обработчика выше")
+    parser.add_argument("--output", type=Path, help="сохранить отчёт JSON в файл")
+    parser.add_argument("--verbose", action="store_true", help="не приглушать лог бота")
+    args = parser.parse_args()
+
+    for option, env in (
+        (args.write_mode, "BOT_ANSWER_WRITE_MODE"),
+        (args.sequence_mode, "BOT_VIDEO_SEQUENCE_MODE"),
+        (args.persistence, "BOT_PERSISTENCE"),
+        (args.rate_limit, "BOT_RATE_LIMIT"),
+    ):
+        if option:
+            os.environ[env] = option
+    # Периодический лог статистики не нужен: отчёт печатается в конце.
+    os.environ["BOT_STATS_LOG_INTERVAL"] = "0"
+    if args.workers:
+        os.environ["BOT_CONCURRENT_UPDATES"] = str(args.workers)
+    else:
+        args.workers = int(os.environ.get("BOT_CONCURRENT_UPDATES", "32"))
+    args.concurrency = args.concurrency or args.participants
+
+    # Лог бенчмарка — во временный каталог, а не в logs/bot.log рабочего бота
+    os.environ.setdefault("BOT_LOG_DIR", tempfile.mkdtemp(prefix="bot-bench-logs-"))
+    sys.path.insert(0, str(SRC_DIR))
+    import tg_bot  # noqa: F401 — настраивает логирование при импорте
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.db:
+        report = asyncio.run(run(args, args.db))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = asyncio.run(run(args, Path(tmp) / "load_test.db"))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+
+    failed = report["errors"] > 0 or report["completed_participants"] < args.participants
+    if args.max_p95_ms is not None and report["latency"]["handler"]["p95_ms"] > args.max_p95_ms:
+        print(f"p95 задержки обработчика выше {args.max_p95_ms} мс", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
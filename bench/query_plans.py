@@ -0,0 +1,294 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Проверка планов запросов: EXPLAIN QUERY PLAN для каждого SQL-запроса, который
+выполняют бот и экспорт (read_db.py).
+
+Запросы бота не перечисляются вручную, а собираются с пула соединений
+(DBPool.on_statement), пока несколько виртуальных участников проходят весь
+сценарий через настоящие обработчики (как в load_test.py, с заглушкой Bot API),
+а администратор (BOT_ADMIN_IDS = ADMIN_ID) запрашивает сводку /stats.
+После прогона на той же базе выполняются запросы, которые при обычном запуске
+идут только при старте бота: подстановка замены видео (warm_up_videos, проверка
+file_id подменяется — одно видео считается заменённым) и пересчёт счётчиков
+/stats (rebuild_summary, только при миграции).
+Запросы экспорта — выгрузки трёх таблиц и запросы отметки --incremental.
+
+Запрос считается деградировавшим, если в его плане есть:
+- полный просмотр таблицы (SCAN). Допускается только внешний цикл выгрузок
+  экспорта и запросов из FULL_SCAN_ALLOWED — они читают всё по смыслу;
+- автоматический индекс (SQLite строит временный индекс, потому что нужного нет);
+- сортировка всего результата во временном B-дереве (ORDER BY, GROUP BY, DISTINCT),
+  кроме пересчётов по всей таблице из REBUILD_ALLOWED.
+Просмотр маленьких CTE из констант (таблица перестановок сценариев; в запросе
+у такого CTE не должно быть псевдонима — в плане видно только имя) не считается.
+
+Код возврата 1, если деградировал хотя бы один запрос.
+
+Запуск:
+    python3 bench/query_plans.py
+    python3 bench/query_plans.py --sequence-mode permutation --write-mode group
+    python3 bench/query_plans.py --db data/ratings.db --verbose   # планы на рабочей базе
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from fake_bot_api import FakeBotAPI
+from updates import generate_participants, message_update
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# Администратор, от имени которого запрашивается /stats
+ADMIN_ID = 1
+
+# Запросы (начало текста), которым разрешён полный просмотр во внешнем цикле, и почему
+FULL_SCAN_ALLOWED: Dict[str, str] = {
+    "SELECT user_id, data FROM bot_user_data": "загрузка состояния всех диалогов при старте",
+    # /stats читает таблицы сводки целиком в порядке первичного ключа (без сортировки);
+    # их размер не зависит от числа участников
+    "SELECT condition, participants, completed FROM stats_conditions": (
+        "/stats: строка на условие эксперимента и одна для ещё не назначенного"
+    ),
+    "SELECT scenario, rating, answers FROM stats_ratings": (
+        "/stats: не больше 10 строк (оценки 1…10) на сценарий"
+    ),
+}
+
+# Пересчёт по всей таблице: разрешены и полный просмотр, и сортировка для GROUP BY
+REBUILD_ALLOWED: Dict[str, str] = {
+    "INSERT INTO stats_conditions(condition, participants, completed) SELECT": (
+        "rebuild_summary: счётчики /stats по всем участникам, один раз при миграции"
+    ),
+    "INSERT INTO stats_ratings(scenario, rating, answers) SELECT scenario, scenario_rating, COUNT(*)": (
+        "rebuild_summary: гистограммы /stats по всем ответам, один раз при миграции"
+    ),
+}
+
+_SKIPPED = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE")
+_CONSTANT_SCAN = re.compile(r"^SCAN (\d+ )?CONSTANT ROWS?$")
+_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)$")
+
+
+class Statement:
+    def __init__(
+        self, source: str, sql: str, params: Tuple = (), full_scan_ok: bool = False, sort_ok: bool = False
+    ):
+        self.source = source
+        self.sql = sql
+        self.params = params
+        self.full_scan_ok = full_scan_ok
+        self.sort_ok = sort_ok
+
+    @property
+    def title(self) -> str:
+        text = " ".join(self.sql.split())
+        return text if len(text) <= 110 else text[:107] + "..."
+
+
+def normalize(sql: str) -> str:
+    """Текст запроса без значений: одинаковые запросы с разными аргументами — один запрос."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())
+
+
+class StatementCollector:
+    def __init__(self, source: str):
+        self.source = source
+        self.statements: Dict[str, Statement] = {}
+
+    def __call__(self, sql: str):
+        text = sql.strip()
+        if not text or text.upper().startswith(_SKIPPED):
+            return
+        key = normalize(text)
+        if key not in self.statements:
+            rebuild = key.startswith(tuple(REBUILD_ALLOWED))
+            full_scan_ok = rebuild or key.startswith(tuple(FULL_SCAN_ALLOWED))
+            self.statements[key] = Statement(self.source, text, full_scan_ok=full_scan_ok, sort_ok=rebuild)
+
+
+def plan_problems(plan: List[Tuple[int, int, int, str]], full_scan_ok: bool, sort_ok: bool = False) -> List[str]:
+    """Признаки деградации в строках EXPLAIN QUERY PLAN (id, parent, _, detail)."""
+    children: Dict[int, List[str]] = {}
+    for node_id, parent, _, detail in plan:
+        children.setdefault(parent, []).append(detail)
+    constant_ctes: Set[str] = set()
+    for node_id, _, _, detail in plan:
+        if detail.startswith("MATERIALIZE ") and all(
+            _CONSTANT_SCAN.match(child) for child in children.get(node_id, [])
+        ):
+            constant_ctes.add(detail.split()[1])
+
+    problems = []
+    outer_loop_seen: Set[int] = set()
+    for _, parent, _, detail in plan:
+        if not detail.startswith(("SCAN ", "SEARCH ")) or _CONSTANT_SCAN.match(detail):
+            if _TEMP_SORT.search(detail) and not sort_ok:
+                problems.append(f"сортировка всего результата: {detail}")
+            continue
+        name = detail.split()[1]
+        outer = parent not in outer_loop_seen
+        outer_loop_seen.add(parent)
+        # (subquery-N) — обход уже посчитанного подзапроса, а не таблицы
+        if name in constant_ctes or name.startswith("("):
+            continue
+        if "AUTOMATIC" in detail:
+            problems.append(f"автоматический индекс: {detail}")
+        elif detail.startswith("SCAN ") and not (outer and full_scan_ok):
+            problems.append(f"полный просмотр: {detail}")
+    return problems
+
+
+async def replace_one_video(bot, files: Dict[str, Dict[str, str]], *args) -> Dict[str, Dict[str, str]]:
+    """Вместо check_video_files: первое видео «заменено», чтобы warm_up_videos обновил БД."""
+    result = {condition: dict(scenarios) for condition, scenarios in files.items()}
+    scenarios = next(iter(result.values()))
+    scenario = next(iter(scenarios))
+    scenarios[scenario] += "-replaced"
+    return result
+
+
+async def collect_bot_statements(db_path: Path, participants: int) -> List[Statement]:
+    import tg_bot
+    from summary_stats import rebuild_summary
+    from telegram import Update
+
+    await tg_bot.create_schema_and_fill(db_path)
+    await tg_bot.init_db_pool(db_path)
+    collector = StatementCollector("бот")
+    tg_bot.db_pool.on_statement = collector
+    tg_bot.init_answer_buffer()
+    app, _ = tg_bot.build_application("123456:QUERY-PLANS", request=FakeBotAPI())
+
+    errors: List[str] = []
+
+    async def count_error(update: object, context):
+        errors.append(repr(context.error))
+
+    app.add_error_handler(count_error)
+    try:
+        await app.initialize()
+        for updates in generate_participants(participants).values():
+            for raw in updates:
+                await app.process_update(Update.de_json(raw, app.bot))
+        if tg_bot.answer_buffer is not None:
+            await tg_bot.answer_buffer.flush()
+        await app.process_update(Update.de_json(message_update(ADMIN_ID, "/stats"), app.bot))
+        tg_bot.check_video_files = replace_one_video
+        await tg_bot.warm_up_videos(app.bot)
+        async with tg_bot.db_pool.writer() as db:
+            await rebuild_summary(db)
+            await db.commit()
+        await app.shutdown()
+    finally:
+        await tg_bot.close_answer_buffer()
+        await tg_bot.close_db_pool()
+
+    if errors:
+        raise RuntimeError(f"Ошибки обработчиков при прогоне сценария: {errors[:3]}")
+    return list(collector.statements.values())
+
+
+def collect_export_statements(db_path: Path) -> List[Statement]:
+    import read_db
+
+    conn = sqlite3.connect(db_path)
+    try:
+        statements = [
+            Statement("экспорт", read_db.PARTICIPANTS_QUERY, full_scan_ok=True),
+            Statement("экспорт", *read_db.answers_query(conn), full_scan_ok=True),
+            Statement("экспорт", *read_db.answers_wide_query(conn), full_scan_ok=True),
+        ]
+        collector = StatementCollector("экспорт")
+        conn.set_trace_callback(collector)
+        marker = read_db.change_marker(conn)
+        read_db.count_changed_participants(conn, marker[0], read_db.high_water_rows(conn, marker[0]))
+        conn.set_trace_callback(None)
+    finally:
+        conn.close()
+    return statements + list(collector.statements.values())
+
+
+def explain(conn: sqlite3.Connection, statement: Statement) -> Tuple[List[Tuple], Optional[str]]:
+    try:
+        return conn.execute("EXPLAIN QUERY PLAN " + statement.sql, statement.params).fetchall(), None
+    except sqlite3.Error as e:
+        return [], str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=3, help="сколько участников проходят сценарий")
+    parser.add_argument("--write-mode", help="BOT_ANSWER_WRITE_MODE: sync, group или lazy")
+    parser.add_argument("--sequence-mode", help="BOT_VIDEO_SEQUENCE_MODE: rows или permutation")
+    parser.add_argument("--db", type=Path, help="строить планы на этой базе (только чтение); по умолчанию — на временной")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args()
+
+    for option, env in ((args.write_mode, "BOT_ANSWER_WRITE_MODE"), (args.sequence_mode, "BOT_VIDEO_SEQUENCE_MODE")):
+        if option:
+            os.environ[env] = option
+    # Без кэша состояния каждое чтение доходит до БД и попадает в проверку
+    os.environ["BOT_STATE_CACHE_SIZE"] = "0"
+    os.environ["BOT_STATS_LOG_INTERVAL"] = "0"
+    # /stats регистрируется только при заданных BOT_ADMIN_IDS
+    os.environ["BOT_ADMIN_IDS"] = str(ADMIN_ID)
+    # Ограничитель отправки растянул бы прогон до секунды на сообщение в каждом чате
+    os.environ.setdefault("BOT_RATE_LIMIT", "off")
+
+    # Лог бенчмарка — во временный каталог, а не в logs/bot.log рабочего бота
+    os.environ.setdefault("BOT_LOG_DIR", tempfile.mkdtemp(prefix="bot-bench-logs-"))
+    sys.path.insert(0, str(SRC_DIR))
+    import tg_bot  # noqa: F401 — настраивает логирование при импорте
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp) / "query_plans.db"
+        statements = asyncio.run(collect_bot_statements(scratch, args.participants))
+        statements += collect_export_statements(scratch)
+
+        target = args.db or "временная, с текущей схемой"
+        if args.db:
+            if not args.db.exists():
+                raise FileNotFoundError(f"База данных не найдена: {args.db}")
+            conn = sqlite3.connect(f"file:{args.db.resolve()}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(scratch)
+        try:
+            failed = 0
+            for statement in statements:
+                plan, error = explain(conn, statement)
+                problems = (
+                    [f"ошибка: {error}"]
+                    if error
+                    else plan_problems(plan, statement.full_scan_ok, statement.sort_ok)
+                )
+                if problems:
+                    failed += 1
+                if problems or args.verbose:
+                    print(f"[{'FAIL' if problems else 'ok'}] {statement.source}: {statement.title}")
+                    for row in plan:
+                        print(f"        {row[3]}")
+                    for problem in problems:
+                        print(f"    ! {problem}")
+        finally:
+            conn.close()
+
+    print(f"Проверено запросов: {len(statements)} (база: {target}), деградировавших: {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Отправка апдейтов на вебхук бота (BOT_MODE=webhook).
+
+По умолчанию апдейты идут на уже запущенного бота (--url). Такой бот работает
+с настоящим токеном: он сам обращается к Bot API (getMe, setWebhook, ответы
+синтетическим user_id) и пишет участников в свою БД. Для проверки без Telegram
+есть --local: бот поднимается в этом же процессе на временной БД с заглушкой
+Bot API (fake_bot_api.FakeBotAPI), вебхук слушает 127.0.0.1:--port, и в отчёт
+добавляются ошибки обработчиков и число дошедших до конца участников.
+
+Апдейты берутся из файла JSON Lines (--file, один апдейт на строку) или
+генерируются для N синтетических участников (--participants). Апдейты одного
+пользователя отправляются строго по очереди, разные пользователи — параллельно.
+
+Замеряется время ответа HTTP-сервера вебхука (приём апдейта в очередь), а не
+время работы обработчиков.
+
+Запуск:
+    python3 bench/replay_webhook.py --local --participants 200
+    python3 bench/replay_webhook.py --participants 200 --secret <BOT_WEBHOOK_SECRET>
+    python3 bench/replay_webhook.py --file recorded_updates.jsonl --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from fake_bot_api import FakeBotAPI
+from latency import latency_summary
+from updates import generate_participants, group_by_user, load_recorded
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+async def replay(
+    url: str,
+    per_user: Dict[int, List[Dict[str, Any]]],
+    secret: str,
+    concurrency: int,
+    think_ms: float,
+) -> Dict[str, Any]:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+
+        async def walk(updates: List[Dict[str, Any]]):
+            async with semaphore:
+                for update in updates:
+                    t0 = time.perf_counter()
+                    try:
+                        response = await client.post(url, content=json.dumps(update))
+                        statuses[response.status_code] += 1
+                    except httpx.HTTPError as e:
+                        statuses[type(e).__name__] += 1
+                    latencies.append(time.perf_counter() - t0)
+                    if think_ms:
+                        await asyncio.sleep(think_ms / 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(walk(updates) for updates in per_user.values()))
+        elapsed = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    return {
+        "users": len(per_user),
+        "updates": total,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency": latency_summary(latencies),
+    }
+
+
+async def replay_local(args: argparse.Namespace, per_user: Dict[int, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Бот с вебхуком на заглушке Bot API и временной БД в этом же процессе."""
+    import tg_bot
+
+    path = "telegram"
+    url = f"http://127.0.0.1:{args.port}/{path}"
+    errors: List[str] = []
+
+    async def count_error(update: object, context):
+        errors.append(repr(context.error))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "replay.db"
+        await tg_bot.create_schema_and_fill(db_path)
+        await tg_bot.init_db_pool(db_path)
+        tg_bot.init_answer_buffer()
+        app, allowed_updates = tg_bot.build_application(
+            "123456:REPLAY", request=FakeBotAPI(latency_ms=args.api_latency_ms)
+        )
+        app.add_error_handler(count_error)
+
+        await app.initialize()
+        # setWebhook уходит в заглушку, поэтому локальный http-адрес допустим
+        await app.updater.start_webhook(
+            listen="127.0.0.1",
+            port=args.port,
+            url_path=path,
+            secret_token=args.secret or None,
+            webhook_url=url,
+            allowed_updates=allowed_updates,
+        )
+        await app.start()
+        try:
+            report = await replay(url, per_user, args.secret, args.concurrency, args.think_ms)
+            # Вебхук отвечает сразу после постановки апдейта в очередь — дожидаемся обработки
+            while app.update_queue.qsize() or tg_bot.user_locks.in_flight:
+                await asyncio.sleep(0.05)
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            await app.shutdown()
+            await tg_bot.close_answer_buffer()
+
+        async with tg_bot.db_pool.reader() as db:
+            cur = await db.execute("SELECT COUNT(*) FROM participants WHERE completed = 1")
+            (completed,) = await cur.fetchone()
+            await cur.close()
+        await tg_bot.close_db_pool()
+
+    report["bot"] = {
+        "errors": len(errors),
+        "completed_participants": completed,
+        "first_errors": errors[:5],
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram", help="адрес вебхука бота")
+    parser.add_argument("--secret", default="", help="значение BOT_WEBHOOK_SECRET")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", type=Path, help="файл JSON Lines с записанными апдейтами")
+    source.add_argument("--participants", type=int, help="число синтетических участников")
+    parser.add_argument("--concurrency", type=int, default=100, help="сколько пользователей отправляют одновременно")
+    parser.add_argument("--think-ms", type=float, default=0, help="пауза между шагами одного пользователя, мс")
+    parser.add_argument("--local", action="store_true", help="поднять бота здесь же на заглушке Bot API и временной БД")
+    parser.add_argument("--port", type=int, default=18443, help="порт вебхука для --local")
+    parser.add_argument("--api-latency-ms", type=float, default=30, help="имитация задержки Bot API для --local, мс")
+    args = parser.parse_args()
+
+    if args.file:
+        per_user = group_by_user(load_recorded(args.file))
+    else:
+        per_user = generate_participants(args.participants)
+
+    if args.local:
+        os.environ["BOT_STATS_LOG_INTERVAL"] = "0"
+        # Ограничитель отправки мерил бы лимиты Telegram, а не бота (как в load_test.py)
+        os.environ.setdefault("BOT_RATE_LIMIT", "off")
+        # Лог бенчмарка — во временный каталог, а не в logs/bot.log рабочего бота
+        os.environ.setdefault("BOT_LOG_DIR", tempfile.mkdtemp(prefix="bot-bench-logs-"))
+        sys.path.insert(0, str(SRC_DIR))
+        import tg_bot  # noqa: F401 — настраивает логирование при импорте
+
+        logging.getLogger().setLevel(logging.WARNING)
+        report = asyncio.run(replay_local(args, per_user))
+    else:
+        report = asyncio.run(replay(args.url, per_user, args.secret, args.concurrency, args.think_ms))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
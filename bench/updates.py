@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Синтетические апдейты Telegram (в формате JSON Bot API) для нагрузочных тестов.
+
+participant_script() выдаёт полный сценарий одного участника:
+/start → имя → пол → возраст → 4 × (описание, два наречия, оценка Likert).
+"""
+
+import itertools
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": f"Участник {user_id}",
+        "username": f"user{user_id}",
+    }
+
+
+def message_update(user_id: int, text: str, date: int = 0) -> Dict[str, Any]:
+    message = {
+        "message_id": next(_ids),
+        "date": date,
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": next(_ids), "message": message}
+
+
+def callback_update(user_id: int, data: str, date: int = 0) -> Dict[str, Any]:
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": _user(user_id),
+            "message": {
+                "message_id": next(_ids),
+                "date": date,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "…",
+            },
+        },
+    }
+
+
+def participant_script(user_id: int, videos: int = 4, rng: random.Random = None) -> List[Dict[str, Any]]:
+    rng = rng or random.Random(user_id)
+    updates = [
+        message_update(user_id, "/start"),
+        message_update(user_id, f"Псевдоним{user_id}"),
+        callback_update(user_id, rng.choice(["gender_female", "gender_male"])),
+        message_update(user_id, str(rng.randint(18, 70))),
+    ]
+    for _ in range(videos):
+        updates += [
+            message_update(user_id, "Робот показывает на предмет на столе"),
+            message_update(user_id, rng.choice(["уверенно", "медленно", "странно"])),
+            message_update(user_id, rng.choice(["осознанно", "случайно", "быстро"])),
+            callback_update(user_id, f"likert_{rng.randint(1, 10)}"),
+        ]
+    return updates
+
+
+def generate_participants(count: int, first_user_id: int = 10_000_000) -> Dict[int, List[Dict[str, Any]]]:
+    """Сценарии для count участников: user_id -> список апдейтов по порядку."""
+    return {
+        user_id: participant_script(user_id)
+        for user_id in range(first_user_id, first_user_id + count)
+    }
+
+
+def load_recorded(path: Path) -> Iterator[Dict[str, Any]]:
+    """Апдейты из файла JSON Lines (один апдейт на строку)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    for key in ("message", "edited_message", "callback_query", "my_chat_member"):
+        if key in update:
+            return update[key]["from"]["id"]
+    return 0
+
+
+def group_by_user(updates: Iterable[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Раскладывает записанные апдейты по пользователям, сохраняя порядок внутри каждого."""
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for update in updates:
+        grouped.setdefault(update_user_id(update), []).append(update)
+    return grouped
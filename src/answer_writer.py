@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Запись ответов участников в таблицу answers.
+
+answer_upsert_sql() строит один INSERT ... ON CONFLICT DO UPDATE для набора полей,
+а AnswerWriteBuffer реализует отложенную запись: поля ответов копятся в памяти
+и сбрасываются группами в одной транзакции — по количеству строк или по таймеру.
+
+Режимы (параметр durable):
+- durable=True  — групповой коммит: submit() возвращается только после того,
+                  как транзакция с этим ответом зафиксирована;
+- durable=False — запись «в фоне»: submit() возвращается сразу, при падении
+                  процесса могут потеряться ответы за последние max_delay_ms.
+"""
+
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from db_pool import NOW_MS_SQL, DBPool
+
+logger = logging.getLogger("experiment_bot.answer_writer")
+
+# Поля answers, которые заполняются по ходу эксперимента
+ANSWER_FIELDS = ("description", "adv_behavior", "adv_choice", "scenario_rating")
+
+
+@lru_cache(maxsize=None)
+def answer_upsert_sql(fields: Tuple[str, ...]) -> str:
+    """Один UPSERT строки answers, обновляющий scenario, file_id, переданные поля и updated_at."""
+    for field in fields:
+        if field not in ANSWER_FIELDS:
+            raise ValueError(f"Недопустимое поле answers: {field}")
+
+    columns = ("user_id", "position", "scenario", "file_id") + fields
+    updates = ",\n                ".join(
+        [f"{col} = excluded.{col}" for col in columns[2:]] + ["updated_at = excluded.updated_at"]
+    )
+    return f"""
+            INSERT INTO answers({", ".join(columns)}, updated_at)
+            VALUES ({", ".join("?" for _ in columns)}, {NOW_MS_SQL})
+            ON CONFLICT(user_id, position) DO UPDATE SET
+                {updates}
+            """
+
+
+class AnswerWriteBuffer:
+    """Буфер отложенной записи полей answers с групповыми транзакциями."""
+
+    def __init__(
+        self,
+        pool: DBPool,
+        durable: bool = True,
+        max_batch: int = 64,
+        max_delay_ms: int = 20,
+        retry_delay: float = 1.0,
+    ):
+        self._pool = pool
+        self.durable = durable
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.retry_delay = retry_delay
+
+        # (user_id, position) -> {"scenario", "file_id", <поля answers>}
+        self._pending: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._in_flight: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._waiters: List[asyncio.Future] = []
+
+        self._has_data = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.fields_submitted = 0
+        self.failures = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="answer-write-buffer")
+
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            # Останавливаем фоновую задачу только между сбросами, а не посреди транзакции
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info("Буфер ответов остановлен. Статистика: %s", self.stats())
+
+    async def submit(
+        self,
+        user_id: int,
+        position: int,
+        scenario: str,
+        file_id: str,
+        field_name: str,
+        value: Any,
+    ):
+        if field_name not in ANSWER_FIELDS:
+            raise ValueError(f"Недопустимое поле answers: {field_name}")
+        if self._closing:
+            raise RuntimeError("Буфер ответов уже остановлен")
+
+        entry = self._pending.setdefault((user_id, position), {})
+        entry["scenario"] = scenario
+        entry["file_id"] = file_id
+        entry[field_name] = value
+        self.fields_submitted += 1
+
+        waiter = None
+        if self.durable:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        self._has_data.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+
+        if waiter is not None:
+            await waiter
+
+    def pending_fields(self, user_id: int, position: int) -> Dict[str, Any]:
+        """Ещё не записанные в БД поля ответа (чтобы чтение видело свои же записи)."""
+        key = (user_id, position)
+        merged = dict(self._in_flight.get(key, {}))
+        merged.update(self._pending.get(key, {}))
+        return merged
+
+    def pending_for_user(self, user_id: int) -> Dict[int, Dict[str, Any]]:
+        """pending_fields() по всем позициям пользователя: позиция -> поля."""
+        result: Dict[int, Dict[str, Any]] = {}
+        for source in (self._in_flight, self._pending):
+            for (uid, position), entry in source.items():
+                if uid == user_id:
+                    result.setdefault(position, {}).update(entry)
+        return result
+
+    async def flush(self):
+        async with self._flush_lock:
+            self._has_data.clear()
+            self._batch_full.clear()
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+            self._in_flight = batch
+
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.failures += 1
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                if not self.durable:
+                    # Ждать некому — возвращаем ответы в буфер, более свежие значения важнее.
+                    for key, entry in batch.items():
+                        merged = dict(entry)
+                        merged.update(self._pending.get(key, {}))
+                        self._pending[key] = merged
+                    self._has_data.set()
+                raise
+            else:
+                self.flushes += 1
+                self.rows_flushed += len(batch)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+            finally:
+                self._in_flight = {}
+
+    async def _write(self, batch: Dict[Tuple[int, int], Dict[str, Any]]):
+        groups: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+        for (user_id, position), entry in batch.items():
+            fields = tuple(f for f in ANSWER_FIELDS if f in entry)
+            groups.setdefault(fields, []).append(
+                (user_id, position, entry["scenario"], entry["file_id"])
+                + tuple(entry[f] for f in fields)
+            )
+
+        async with self._pool.writer() as db:
+            for fields, rows in groups.items():
+                await db.executemany(answer_upsert_sql(fields), rows)
+            await db.commit()
+
+    async def _run(self):
+        while True:
+            await self._has_data.wait()
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать пакет ответов в БД")
+                await asyncio.sleep(self.retry_delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "durable": self.durable,
+            "pending_rows": len(self._pending),
+            "fields_submitted": self.fields_submitted,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "avg_batch": round(self.rows_flushed / self.flushes, 2) if self.flushes else 0.0,
+            "failures": self.failures,
+        }
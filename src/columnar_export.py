@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Экспорт таблиц participants, answers и answers_wide в колоночные форматы для анализа:
+Parquet, Feather (Arrow IPC) и CSV со сжатием gzip.
+
+В отличие от Excel, колонки сохраняются с типами: целые age, video_position и
+answer_scenario_rating (с пропусками), логическое completed, дата created_at и
+категориальные condition, gender, video_scenario. pandas/pyarrow читают такие
+файлы на порядок быстрее .xlsx, а категории не приходится восстанавливать.
+
+Parquet и Feather требуют пакет pyarrow (необязательная зависимость); CSV.gz
+пишется средствами pandas. Строки читаются из SQLite порциями, поэтому память
+не растёт с числом ответов (кроме Feather: перед записью таблица собирается в
+Arrow целиком — в сжатом колоночном виде это на порядок меньше DataFrame).
+"""
+
+import gzip
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from scenarios import SCENARIOS
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet и Feather недоступны, CSV.gz работает
+    pa = None
+
+# Проверенная версия pyarrow (новее требует NumPy 2, а в requirements.txt — numpy 1.24)
+PYARROW_REQUIREMENT = "pyarrow==14.0.2"
+
+# Формат → расширение файла
+FORMATS = {
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv.gz": ".csv.gz",
+}
+
+# Типы колонок в порядке выдачи запросов из read_db.py.
+# int — целое с пропусками, bool — логическое, category — категория,
+# timestamp — дата и время, string — текст.
+_PERSON_TYPES = {
+    "user_id": "int",
+    "tg_username": "string",
+    "first_name": "string",
+    "participant_name": "string",
+    "gender": "category",
+    "age": "int",
+    "condition": "category",
+}
+
+TABLE_TYPES: Dict[str, Dict[str, str]] = {
+    "participants": {
+        **_PERSON_TYPES,
+        "completed": "bool",
+        "created_at": "timestamp",
+    },
+    "answers": {
+        **_PERSON_TYPES,
+        "video_position": "int",
+        "video_scenario": "category",
+        "answer_description": "string",
+        "answer_adv_behavior": "string",
+        "answer_adv_choice": "string",
+        "answer_scenario_rating": "int",
+    },
+    "answers_wide": {
+        **_PERSON_TYPES,
+        "completed": "bool",
+        **{
+            f"{scenario}_{field}": kind
+            for scenario in SCENARIOS
+            for field, kind in (
+                ("position", "int"),
+                ("description", "string"),
+                ("adv_behavior", "string"),
+                ("adv_choice", "string"),
+                ("rating", "int"),
+            )
+        },
+    },
+}
+
+_PANDAS_DTYPES = {
+    "int": "Int64",
+    "bool": "boolean",
+    "category": "category",
+    "string": "string",
+}
+
+
+def require_pyarrow(fmt: str):
+    if fmt in ("parquet", "feather") and pa is None:
+        raise RuntimeError(
+            f"Для формата {fmt} нужен пакет pyarrow, совместимый с установленным numpy: "
+            f"pip install {PYARROW_REQUIREMENT} (или pip install -r requirements-export.txt)"
+        )
+
+
+def _stem(out_path: Path) -> str:
+    name = out_path.name
+    for suffix in (".xlsx", *FORMATS.values()):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def with_format(out_path: Path, fmt: str) -> Path:
+    """experiment_results.xlsx → experiment_results.parquet (для fmt='parquet')"""
+    return out_path.with_name(_stem(out_path) + FORMATS[fmt])
+
+
+def output_path(out_path: Path, table: str, fmt: str) -> Path:
+    """experiment_results.parquet → experiment_results.<table>.parquet"""
+    return out_path.with_name(f"{_stem(out_path)}.{table}{FORMATS[fmt]}")
+
+
+def typed_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Приводит колонки порции из SQLite к типам из TABLE_TYPES."""
+    types = TABLE_TYPES[table]
+    df = df[list(types)]
+    converted = {}
+    for column, kind in types.items():
+        if kind == "timestamp":
+            converted[column] = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+        elif kind == "bool":
+            converted[column] = df[column].astype("Int64").astype("boolean")
+        else:
+            converted[column] = df[column].astype(_PANDAS_DTYPES[kind])
+    return pd.DataFrame(converted)
+
+
+def arrow_schema(table: str) -> "pa.Schema":
+    """
+    Схема задаётся заранее, а не выводится из первой порции: в ней колонка может
+    оказаться целиком пустой, и тип у следующих порций разошёлся бы.
+    """
+    arrow_types = {
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(column, arrow_types[kind]) for column, kind in TABLE_TYPES[table].items()])
+
+
+def write_table(
+    conn: sqlite3.Connection,
+    table: str,
+    query: str,
+    params: List,
+    path: Path,
+    fmt: str,
+    chunk_size: int,
+) -> int:
+    """Пишет результат запроса в файл формата fmt порциями по chunk_size строк. Возвращает число строк."""
+    require_pyarrow(fmt)
+    chunks = (typed_frame(chunk, table) for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunk_size))
+    written = 0
+
+    if fmt == "csv.gz":
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            pd.DataFrame(columns=list(TABLE_TYPES[table])).to_csv(f, index=False)
+            for chunk in chunks:
+                chunk.to_csv(f, header=False, index=False)
+                written += len(chunk)
+        return written
+
+    schema = arrow_schema(table)
+
+    def to_arrow(chunk: pd.DataFrame) -> "pa.Table":
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+    if fmt == "parquet":
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for chunk in chunks:
+                writer.write_table(to_arrow(chunk))
+                written += len(chunk)
+        return written
+
+    if fmt == "feather":
+        # В Arrow IPC у всех порций должен быть один словарь категорий,
+        # поэтому порции собираются в одну таблицу и словари объединяются.
+        parts = []
+        for chunk in chunks:
+            parts.append(to_arrow(chunk))
+            written += len(chunk)
+        arrow_table = pa.concat_tables(parts) if parts else schema.empty_table()
+        feather.write_feather(arrow_table.unify_dictionaries(), path, compression="zstd")
+        return written
+
+    raise ValueError(f"Неизвестный формат экспорта: {fmt}")
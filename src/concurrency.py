@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Параллельная обработка апдейтов с сохранением порядка для каждого участника.
+
+Application обрабатывает до N апдейтов одновременно (concurrent_updates), а
+обработчики оборачиваются в serialized_per_user(): апдейты одного пользователя
+выполняются строго по очереди, поэтому двойное нажатие кнопки Likert не может
+обогнать update_participant_progress предыдущего нажатия.
+"""
+
+import asyncio
+import functools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable
+
+from telegram import Update
+
+logger = logging.getLogger("experiment_bot.concurrency")
+
+
+class PerUserLocks:
+    """asyncio.Lock на каждого пользователя; замок удаляется, когда его никто не держит и не ждёт."""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.contended = 0
+        self.processed = 0
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+
+        if lock.locked():
+            self.contended += 1
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await lock.acquire()
+        except BaseException:
+            self.waiting -= 1
+            self._release_ref(key)
+            raise
+        self.waiting -= 1
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+            lock.release()
+            self._release_ref(key)
+
+    def _release_ref(self, key: Hashable):
+        refs = self._users[key] - 1
+        if refs:
+            self._users[key] = refs
+        else:
+            del self._users[key]
+            del self._locks[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users_active": len(self._locks),
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting_user_lock": self.waiting,
+            "max_waiting_user_lock": self.max_waiting,
+            "contended": self.contended,
+            "processed": self.processed,
+        }
+
+
+Callback = Callable[[Update, Any], Awaitable[Any]]
+
+
+def serialized_per_user(locks: PerUserLocks, callback: Callback) -> Callback:
+    """Оборачивает обработчик так, чтобы апдейты одного пользователя не шли параллельно."""
+
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: Any) -> Any:
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            return await callback(update, context)
+        async with locks.hold(user.id):
+            return await callback(update, context)
+
+    return wrapper
@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Пул долгоживущих соединений aiosqlite для бота.
+
+Каждое aiosqlite.connect() запускает отдельный поток и заново открывает файл БД,
+поэтому хелперы tg_bot.py работают через общий пул:
+- одно соединение на запись (запись в SQLite всё равно последовательная);
+- N соединений на чтение, которые в режиме WAL не блокируются писателем.
+
+Пул создаётся в main() и закрывается при остановке приложения.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import aiosqlite
+
+logger = logging.getLogger("experiment_bot.db_pool")
+
+# SQL-выражение «сейчас» в миллисекундах Unix-времени — для колонок updated_at,
+# по которым read_db.py --incremental находит изменённые строки
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+class _PoolMetrics:
+    """Счётчики ожидания и использования для одной группы соединений."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.statements = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def started_waiting(self):
+        self.waiting += 1
+
+    def acquired(self, waited: float):
+        self.waiting -= 1
+        self.acquisitions += 1
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def cancelled(self):
+        self.waiting -= 1
+
+    def released(self):
+        self.in_use -= 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        avg = self.wait_total / self.acquisitions if self.acquisitions else 0.0
+        return {
+            "acquisitions": self.acquisitions,
+            "statements": self.statements,
+            "waiting": self.waiting,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "wait_avg_ms": round(avg * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "wait_total_ms": round(self.wait_total * 1000, 3),
+        }
+
+
+class DBPool:
+    """
+    Одно соединение-писатель (под asyncio.Lock) и очередь соединений-читателей.
+
+    Использование:
+        async with pool.reader() as db:
+            cur = await db.execute("SELECT ...")
+        async with pool.writer() as db:
+            await db.execute("UPDATE ...")
+            await db.commit()
+
+    on_release(group, statements), если задан, вызывается при возврате соединения
+    в пул: group — 'reader' или 'writer', statements — сколько SQL-запросов
+    выполнено, пока соединение было занято (для metrics.Metrics.db_used).
+    on_statement(sql), если задан, получает текст каждого выполненного запроса
+    (для диагностики планов запросов, bench/query_plans.py).
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        readers: int = 4,
+        busy_timeout_ms: int = 5000,
+        on_release: Optional[Callable[[str, int], None]] = None,
+        on_statement: Optional[Callable[[str], None]] = None,
+    ):
+        if readers < 1:
+            raise ValueError(f"Размер пула читателей должен быть >= 1, получено: {readers}")
+
+        self.db_path = db_path
+        self.readers_count = readers
+        self.busy_timeout_ms = busy_timeout_ms
+        self.on_release = on_release
+        self.on_statement = on_statement
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+
+        self._writer_metrics = _PoolMetrics()
+        self._reader_metrics = _PoolMetrics()
+        # Число выполненных SQL-запросов по каждому соединению
+        self._statements: Dict[aiosqlite.Connection, int] = {}
+        self._closed = True
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.db_path)
+        metrics = self._reader_metrics if read_only else self._writer_metrics
+        self._statements[db] = 0
+
+        def count_statement(sql: str):
+            # Вызывается из потока соединения aiosqlite; для счётчиков статистики этого достаточно.
+            metrics.statements += 1
+            self._statements[db] += 1
+            if self.on_statement is not None:
+                self.on_statement(sql)
+
+        await db.set_trace_callback(count_statement)
+        await db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};")
+        if read_only:
+            await db.execute("PRAGMA query_only = ON;")
+        return db
+
+    async def open(self):
+        if not self._closed:
+            return
+
+        # Писателя открываем первым: он переводит файл в WAL до появления читателей.
+        self._writer = await self._connect(read_only=False)
+        await self._writer.execute("PRAGMA journal_mode = WAL;")
+
+        for _ in range(self.readers_count):
+            db = await self._connect(read_only=True)
+            self._readers.append(db)
+            self._idle_readers.put_nowait(db)
+
+        self._closed = False
+        logger.info(
+            "Пул БД открыт: 1 писатель + %d читателей (%s)", self.readers_count, self.db_path
+        )
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        logger.info("Закрываю пул БД. Статистика: %s", self.stats())
+
+        for db in self._readers:
+            await db.close()
+        self._readers.clear()
+        self._idle_readers = asyncio.Queue()
+
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+        self._statements.clear()
+
+    def _ensure_open(self):
+        if self._closed:
+            raise RuntimeError("Пул соединений с БД не открыт")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        self._ensure_open()
+        metrics = self._reader_metrics
+        metrics.started_waiting()
+        t0 = time.perf_counter()
+        try:
+            db = await self._idle_readers.get()
+        except BaseException:
+            metrics.cancelled()
+            raise
+        metrics.acquired(time.perf_counter() - t0)
+        statements_before = self._statements[db]
+        try:
+            yield db
+        finally:
+            metrics.released()
+            self._released("reader", db, statements_before)
+            self._idle_readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        self._ensure_open()
+        metrics = self._writer_metrics
+        metrics.started_waiting()
+        t0 = time.perf_counter()
+        try:
+            await self._writer_lock.acquire()
+        except BaseException:
+            metrics.cancelled()
+            raise
+        metrics.acquired(time.perf_counter() - t0)
+        writer = self._writer
+        statements_before = self._statements[writer]
+        try:
+            try:
+                yield writer
+            except BaseException:
+                # Не оставляем незавершённую транзакцию следующему владельцу писателя.
+                if writer.in_transaction:
+                    await writer.rollback()
+                raise
+        finally:
+            metrics.released()
+            self._released("writer", writer, statements_before)
+            self._writer_lock.release()
+
+    def _released(self, group: str, db: aiosqlite.Connection, statements_before: int):
+        if self.on_release is not None:
+            self.on_release(group, self._statements[db] - statements_before)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "readers_total": self.readers_count,
+            "readers_idle": self._idle_readers.qsize(),
+            "writer": self._writer_metrics.as_dict(),
+            "reader": self._reader_metrics.as_dict(),
+        }
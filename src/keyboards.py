@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Inline-клавиатуры бота, собранные один раз при импорте.
+
+Клавиатуры не меняются от участника к участнику, поэтому обработчики
+отправляют готовые объекты, а не собирают InlineKeyboardMarkup из кнопок на
+каждое сообщение. Объекты python-telegram-bot после создания неизменяемы, так
+что один экземпляр безопасно использовать из параллельных обработчиков.
+
+FrozenInlineKeyboard к тому же хранит готовый словарь для JSON: при отправке
+PTB вызывает to_dict() у reply_markup, и обход кнопок не повторяется.
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Шкала Likert: оценки 1..LIKERT_MAX, по LIKERT_PER_ROW кнопок в ряду
+LIKERT_MAX = 10
+LIKERT_PER_ROW = 5
+
+# Кнопки выбора пола: (текст, callback_data)
+GENDER_BUTTONS = (
+    ("👩 Женский", "gender_female"),
+    ("👨 Мужской", "gender_male"),
+)
+
+
+class FrozenInlineKeyboard(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup с сериализацией, посчитанной один раз при создании."""
+
+    __slots__ = ("_serialized",)
+
+    def __init__(self, rows: Sequence[Sequence[Tuple[str, str]]]):
+        super().__init__(
+            [[InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in rows]
+        )
+        self._serialized = super().to_dict()
+
+    def to_dict(self, recursive: bool = True) -> Dict[str, Any]:
+        # Копия верхнего уровня: вызывающий может дописать в словарь свои ключи
+        return dict(self._serialized)
+
+
+def likert_rows(scale: int = LIKERT_MAX, per_row: int = LIKERT_PER_ROW) -> List[List[Tuple[str, str]]]:
+    buttons = [(str(i), f"likert_{i}") for i in range(1, scale + 1)]
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+
+
+GENDER_KEYBOARD = FrozenInlineKeyboard([GENDER_BUTTONS])
+LIKERT_KEYBOARD = FrozenInlineKeyboard(likert_rows())
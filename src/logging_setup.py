@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Неблокирующее логирование для бота.
+
+Обработчики бота работают в потоке цикла событий asyncio, и запись в файл
+прямо из logger.info() при медленном диске задерживает обработку апдейтов.
+Поэтому корневой логгер пишет только в очередь (QueueHandler), а в файл с
+ротацией по размеру и в консоль записи выводит фоновый поток QueueListener.
+
+Формат файла — обычный текст или JSON Lines (по одному объекту на строку).
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись лога — один JSON-объект в строке."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение собираем сразу: объекты из args могут измениться, пока запись
+        # лежит в очереди. Трейсбек сохраняем текстом отдельно от сообщения, чтобы
+        # форматтер файла (текстовый или JSON) сам решил, куда его положить.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(
+    log_file: Path,
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    json_lines: bool = False,
+) -> logging.handlers.QueueListener:
+    """
+    Настраивает корневой логгер: QueueHandler → фоновый поток → файл с ротацией
+    (max_bytes, backup_count; 0 — без ротации) и консоль. Повторный вызов
+    перенастраивает логирование. Поток останавливается при выходе из процесса.
+    """
+    global _listener
+    stop_logging()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток (вызывается и через atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Каталог текстов бота.
+
+Все сообщения участникам собраны здесь и готовы к отправке при импорте модуля:
+обработчики берут текст из словаря по ключу шага (или сценария), а не собирают
+f-строки на каждое сообщение.
+
+- TEXTS          — обычный текст (отправляется без parse_mode);
+- MARKDOWN_TEXTS — текст для parse_mode="Markdown";
+- RATING_QUESTIONS[сценарий] — вопрос со шкалой 1–10 (Markdown);
+- GENDER_CHOSEN[пол]         — подтверждение выбора пола (Markdown);
+- video_caption() и final_message() — тексты с номером видео и именем участника.
+
+Разметка всех Markdown-текстов проверяется при импорте (check_markdown): ошибка
+в тексте остановит запуск бота, а не превратится в BadRequest
+«can't parse entities» посреди сессии участника.
+"""
+
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from scenarios import SCENARIOS
+
+# Ссылка на Google-форму
+GOOGLE_FORM_URL = "https://example.com/google-form"  # ЗАМЕНИТЕ НА РЕАЛЬНУЮ ССЫЛКУ
+
+# Формулировки пар утверждений для шкалы 1–10
+SCENARIO_QUESTIONS: Dict[str, Tuple[str, str]] = {
+    "Пицца": (
+        "Ф-2 выбирает подходящие ингредиенты для пиццы",
+        "Ф-2 получает команду от компьютера указать на ингредиенты слева",
+    ),
+    "Наперстки": (
+        "Ф-2 пытается обыграть испытуемую в напёрстки",
+        "Ф-2 получает команду от компьютера указать на средний стаканчик",
+    ),
+    "Детали": (
+        "Ф-2 оценивает, какая деталь подходит для хвоста",
+        "Ф-2 получает команду от компьютера указать на деталь с определённым QR-кодом",
+    ),
+    "Шахматы": (
+        "Ф-2 обдумывает свой следующий ход",
+        "Ф-2 получает команду от компьютера указать на свободную клетку",
+    ),
+}
+
+TEXTS: Dict[str, str] = {
+    # Общие вопросы
+    "ask_name": (
+        "1️⃣/3️⃣ — Как вас можно назвать в этом исследовании? "
+        "Напишите имя или псевдоним (запомните его — потом укажете в Google-форме)."
+    ),
+    "ask_gender": "2️⃣/3️⃣ — Укажите ваш пол:",
+    "ask_age": "3️⃣/3️⃣ — Укажите, пожалуйста, ваш возраст (числом):",
+    "ask_age_after_text": "3️⃣/3️⃣ Укажите, пожалуйста, ваш возраст (числом).",
+    "age_invalid": "3️⃣/3️⃣ — Пожалуйста, укажите возраст целым числом (например, 25).",
+    "already_completed": (
+        "🎉 Спасибо за участие! Ваши ответы уже сохранены. "
+        "Если хотите проверить, можно ли заполнить Google-форму — ссылка ниже:"
+    ),
+    "resume": "Мы продолжаем ваш эксперимент с того места, где вы остановились.",
+    "press_start": "Пожалуйста, нажмите /start, чтобы начать или продолжить эксперимент.",
+
+    # Вопросы по видео
+    "ask_description": "2️⃣/4️⃣ Опишите, что делает робот на этом видео.",
+    "ask_adv_behavior": (
+        "3️⃣/4️⃣ Вставьте наречие вместо пробела.\n"
+        "Робот ведёт себя ____ (Как?)"
+    ),
+    "ask_adv_choice": (
+        "4️⃣/4️⃣ Вставьте наречие вместо пробела.\n"
+        "Робот делает выбор ____ (Как?)"
+    ),
+    "thanks_ask_adv_behavior": (
+        "Спасибо.\n\n"
+        "3. Вставьте наречие вместо пробела.\n"
+        "Робот ведёт себя ____ (Как?)"
+    ),
+    "thanks_ask_adv_choice": (
+        "Спасибо.\n\n"
+        "4. Вставьте наречие вместо пробела.\n"
+        "Робот делает выбор ____ (Как?)"
+    ),
+    "use_rating_buttons": "Пожалуйста, выберите число от 1 до 10, нажав на одну из кнопок под вопросом.",
+    "already_answered": "Этот ответ уже учтён.",
+    "next_video": "Спасибо! Переходим к следующему видео.",
+    "send_video": "Пожалуйста, отправьте видео.",
+
+    # Ошибки и восстановление сессии
+    "session_not_found": "Не удалось найти вашу сессию. Нажмите /start, чтобы начать сначала.",
+    "session_missing_or_done": "Сессия эксперимента не найдена или уже завершена. Нажмите /start.",
+    "video_missing": (
+        "Ошибка: не найдена информация о текущем видео. "
+        "Пожалуйста, напишите организатору или попробуйте позже."
+    ),
+    "video_missing_contact": (
+        "Ошибка: не найдена информация о текущем видео. "
+        "Нажмите /start или обратитесь к организатору."
+    ),
+    "video_missing_start": "Ошибка: не найдена информация о текущем видео. Нажмите /start.",
+    "stage_restore_error": "Произошла ошибка с восстановлением шага. Нажмите /start, чтобы начать заново.",
+    "stage_unknown": "Похоже, произошла ошибка с определением шага. Нажмите /start, чтобы восстановить сессию.",
+    "button_expired": "🕒 Эта кнопка устарела. Нажмите /start, чтобы восстановить сессию.",
+    "answer_error": "⚠️ Возникла ошибка при обработке ответа. Нажмите /start, чтобы продолжить.",
+    "unexpected_error": "⚠️ Произошла неожиданная ошибка. Нажмите /start, чтобы продолжить.",
+    "error": "⚠️ Произошла ошибка. Пожалуйста, нажмите /start, чтобы продолжить.",
+}
+
+MARKDOWN_TEXTS: Dict[str, str] = {
+    "instruction": (
+        "Спасибо, что согласились принять участие в исследовании "
+        "Лаборатории нейрокогнитивных технологий и робототехники (Курчатовский институт).\n\n"
+        "Вам нужно будет посмотреть 4 коротких видео и ответить на несколько вопросов по каждому из них — "
+        "это займёт примерно 5–10 минут.\n"
+        "В конце этого диалога появится ссылка на Google-форму, где нужно будет заполнить более подробный "
+        "опрос о ваших психологических характеристиках, отношении к роботам, ценностях и т.д. — "
+        "этот опрос займёт примерно 20–25 минут.\n\n"
+        "Пожалуйста, укажите одинаковое имя или псевдоним в обеих анкетах — это необходимо для последующего "
+        "объединения данных. Участие добровольное, все данные обрабатываются анонимно.\n\n"
+        "Рекомендации: для просмотра видео выберите тихое место либо используйте наушники.\n\n"
+        "📋 Сначала, ответьте, пожалуйста на *3 личных вопроса*.\n\n"
+        + TEXTS["ask_name"]
+    ),
+    "main_part_intro": (
+        "Спасибо! Общие данные записаны.\n\n"
+        "Теперь начнётся основная часть эксперимента: вам будет показано *4 видео*.\n\n"
+        "Для каждого видео:\n"
+        "• Посмотрите видео со звуком.\n"
+        "• Опишите, что делает робот.\n"
+        "• Вставьте два наречия (как он ведёт себя и как делает выбор).\n"
+        "• Оцените, какое из двух утверждений лучше описывает происходящее.\n\n"
+        "Начнём с первого видео."
+    ),
+}
+
+
+def _rating_question(left: str, right: str) -> str:
+    return (
+        f"🧩 *К какому утверждению вы больше склоняетесь?*\n\n"
+        f"1️⃣ {left}\n"
+        f"2️⃣ {right}\n\n"
+        "Пожалуйста, выберите число от 1 до 10, показывающее, "
+        "какое из двух утверждений, на ваш взгляд, лучше всего описывает происходящее на видео: "
+        "чем ближе число к 1 — тем больше подходит *первое утверждение*, "
+        "чем ближе к 10 — тем больше подходит *второе утверждение*."
+    )
+
+
+RATING_QUESTIONS: Dict[str, str] = {
+    scenario: _rating_question(*statements) for scenario, statements in SCENARIO_QUESTIONS.items()
+}
+
+GENDER_CHOSEN: Dict[str, str] = {
+    gender: f"2️⃣/3️⃣ Вы указали пол: *{gender}*.\n\n" + TEXTS["ask_age"]
+    for gender in ("Женский", "Мужской")
+}
+
+_FINAL_MESSAGE = (
+    "Спасибо! Все ваши ответы сохранены.\n\n"
+    "Теперь, пожалуйста, перейдите по ссылке для прохождения подробного опроса "
+    "о ваших психологических характеристиках, отношении к роботам, ценностях и т.д.\n\n"
+    f"👉 {GOOGLE_FORM_URL}\n\n"
+    "Пожалуйста, укажите в Google-форме то же имя или псевдоним, "
+    "который вы написали в начале диалога: «{name}»."
+)
+
+
+@lru_cache(maxsize=None)
+def video_caption(number: int, total: int) -> str:
+    """
+    Подпись к видео number из total (нумерация с 1). Вопрос про описание входит
+    в подпись: видео и вопрос приходят одним сообщением, без второго запроса.
+    """
+    return (
+        f"🎥 Видео {number} из {total}.\n\n"
+        "1️⃣/4️⃣ Пожалуйста, посмотрите это видео со звуком.\n\n"
+        + TEXTS["ask_description"]
+    )
+
+
+def final_message(name: str) -> str:
+    """Финальное сообщение со ссылкой на форму; name — имя или псевдоним участника как есть."""
+    return _FINAL_MESSAGE.replace("{name}", name)
+
+
+def check_markdown(text: str):
+    """
+    Проверка разметки Telegram Markdown (legacy, parse_mode="Markdown"): каждый
+    *, _, ` и ``` закрыт, у [текст] есть (ссылка). Экранирование — обратной косой
+    чертой. Бросает ValueError с позицией ошибки.
+    """
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text) and text[i + 1] in "_*`[":
+            i += 2
+            continue
+        if char in "*_`":
+            marker = "```" if text.startswith("```", i) else char
+            end = text.find(marker, i + len(marker))
+            if end == -1:
+                raise ValueError(f"Незакрытый {marker!r} в позиции {i}: {text[i:i + 30]!r}")
+            i = end + len(marker)
+            continue
+        if char == "[":
+            close = text.find("]", i + 1)
+            if close == -1 or not text.startswith("(", close + 1) or text.find(")", close + 2) == -1:
+                raise ValueError(f"Ссылка без [текст](адрес) в позиции {i}: {text[i:i + 30]!r}")
+            i = text.find(")", close + 2) + 1
+            continue
+        i += 1
+
+
+def validate_catalogue():
+    """Проверка каталога при импорте: разметка Markdown-текстов и вопросы для всех сценариев."""
+    missing = [scenario for scenario in SCENARIOS if scenario not in RATING_QUESTIONS]
+    if missing:
+        raise ValueError(f"Нет вопроса со шкалой для сценариев: {missing}")
+
+    markdown = dict(MARKDOWN_TEXTS)
+    markdown.update({f"rating:{k}": v for k, v in RATING_QUESTIONS.items()})
+    markdown.update({f"gender:{k}": v for k, v in GENDER_CHOSEN.items()})
+    for key, text in markdown.items():
+        try:
+            check_markdown(text)
+        except ValueError as e:
+            raise ValueError(f"Ошибка разметки в тексте {key!r}: {e}") from None
+
+
+validate_catalogue()
@@ -0,0 +1,369 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Инструментирование обработчиков, хелперов БД и запросов к Bot API.
+
+Для каждого обработчика и хелпера БД копятся: число вызовов и ошибок,
+гистограмма времени выполнения, а также сколько SQL-запросов, обращений к
+пулу БД и вызовов Bot API пришлось на эти вызовы. Счётчики одного апдейта
+живут в contextvars: обработчик, вызванный для апдейта, открывает «область»,
+и всё, что выполнено внутри неё (в том числе во вложенных хелперах),
+приписывается ему.
+
+Метрики отдаются в текстовом формате Prometheus (MetricsServer) и кратко
+пишутся в лог вместе с остальной статистикой нагрузки (Metrics.summary()).
+"""
+
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger("experiment_bot.metrics")
+
+# Границы корзин гистограммы времени выполнения, сек
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _UpdateCounters:
+    """Счётчики текущего апдейта; все области внутри апдейта видят один объект."""
+
+    __slots__ = ("sql_statements", "pool_checkouts", "api_calls")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.pool_checkouts = 0
+        self.api_calls = 0
+
+    def snapshot(self) -> Tuple[int, int, int]:
+        return self.sql_statements, self.pool_checkouts, self.api_calls
+
+
+_current: "contextvars.ContextVar[Optional[_UpdateCounters]]" = contextvars.ContextVar(
+    "experiment_bot_update_counters", default=None
+)
+
+
+class _SectionStats:
+    """Статистика одного обработчика или хелпера."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self.sql_statements = 0
+        self.pool_checkouts = 0
+        self.api_calls = 0
+
+    def observe(self, seconds: float, failed: bool, deltas: Tuple[int, int, int]):
+        self.calls += 1
+        self.errors += failed
+        self.seconds_total += seconds
+        self.seconds_max = max(self.seconds_max, seconds)
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        sql, checkouts, api = deltas
+        self.sql_statements += sql
+        self.pool_checkouts += checkouts
+        self.api_calls += api
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по гистограмме (верхняя граница корзины), сек."""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.seconds_max
+
+    def summary(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.seconds_total / calls * 1000, 3),
+            "p95_ms_le": round(self.quantile(0.95) * 1000, 3),
+            "max_ms": round(self.seconds_max * 1000, 3),
+            "sql_per_call": round(self.sql_statements / calls, 2),
+            "pool_checkouts_per_call": round(self.pool_checkouts / calls, 2),
+            "api_calls_per_call": round(self.api_calls / calls, 2),
+        }
+
+
+class Metrics:
+    """
+    Реестр метрик. kind — вид инструментируемого кода ('handler' или 'db';
+    'send_queue' — ожидание в очереди отправки, см. rate_limiter.py),
+    он же входит в имя метрики Prometheus.
+
+    Использование:
+        metrics = Metrics()
+
+        @metrics.instrument("db")
+        async def get_participant(user_id): ...
+
+        app.add_handler(CommandHandler("start", metrics.wrap("handler", start)))
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.sections: Dict[Tuple[str, str], _SectionStats] = {}
+        self.updates = 0
+        self.api_requests: Dict[str, List[float]] = {}  # метод -> [число, сумма секунд]
+
+    def _section(self, kind: str, name: str) -> _SectionStats:
+        key = (kind, name)
+        stats = self.sections.get(key)
+        if stats is None:
+            stats = self.sections[key] = _SectionStats(self.buckets)
+        return stats
+
+    def wrap(self, kind: str, func: Callable[..., Awaitable[Any]], name: Optional[str] = None):
+        """Оборачивает корутинную функцию; самая внешняя обёртка открывает счётчики апдейта."""
+        section_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            counters = _current.get()
+            token = None
+            if counters is None:
+                counters = _UpdateCounters()
+                token = _current.set(counters)
+                if kind == "handler":
+                    self.updates += 1
+            before = counters.snapshot()
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                after = counters.snapshot()
+                self._section(kind, section_name).observe(
+                    time.perf_counter() - started,
+                    failed,
+                    tuple(a - b for a, b in zip(after, before)),
+                )
+                if token is not None:
+                    _current.reset(token)
+
+        return wrapper
+
+    def instrument(self, kind: str, name: Optional[str] = None):
+        """Вариант wrap() в виде декоратора."""
+
+        def decorator(func):
+            return self.wrap(kind, func, name)
+
+        return decorator
+
+    # --- события, приходящие снизу -------------------------------------------
+
+    def db_used(self, group: str, statements: int):
+        """Колбэк DBPool: соединение из группы group вернули в пул после statements запросов."""
+        counters = _current.get()
+        if counters is not None:
+            counters.pool_checkouts += 1
+            counters.sql_statements += statements
+
+    def observe(self, kind: str, name: str, seconds: float):
+        """Замер вне обработчика (например, ожидание в очереди отправки): только время."""
+        self._section(kind, name).observe(seconds, False, (0, 0, 0))
+
+    def api_called(self, method: str, seconds: float):
+        counters = _current.get()
+        if counters is not None:
+            counters.api_calls += 1
+        entry = self.api_requests.setdefault(method, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    # --- отчёты ------------------------------------------------------------------
+
+    def summary(self) -> Dict[str, Any]:
+        """Краткая сводка для лога: по обработчикам и хелперам БД."""
+        result: Dict[str, Any] = {"updates": self.updates}
+        for (kind, name), stats in sorted(self.sections.items()):
+            result.setdefault(kind, {})[name] = stats.summary()
+        result["api"] = {
+            method: {"calls": int(count), "avg_ms": round(total / count * 1000, 3)}
+            for method, (count, total) in sorted(self.api_requests.items())
+        }
+        return result
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)."""
+        lines: List[str] = [
+            "# HELP experiment_bot_updates_total Updates handled by the bot handlers.",
+            "# TYPE experiment_bot_updates_total counter",
+            f"experiment_bot_updates_total {self.updates}",
+        ]
+
+        by_kind: Dict[str, List[Tuple[str, _SectionStats]]] = {}
+        for (kind, name), stats in sorted(self.sections.items()):
+            by_kind.setdefault(kind, []).append((name, stats))
+
+        for kind, sections in by_kind.items():
+            base = f"experiment_bot_{kind}"
+            lines += [
+                f"# HELP {base}_seconds Wall time of instrumented {kind} calls.",
+                f"# TYPE {base}_seconds histogram",
+            ]
+            for name, stats in sections:
+                cumulative = 0
+                for bound, count in zip(stats.buckets, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{base}_seconds_bucket{{name="{name}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{base}_seconds_bucket{{name="{name}",le="+Inf"}} {stats.calls}')
+                lines.append(f'{base}_seconds_sum{{name="{name}"}} {stats.seconds_total:.6f}')
+                lines.append(f'{base}_seconds_count{{name="{name}"}} {stats.calls}')
+
+            for metric, attr, help_text in (
+                ("errors_total", "errors", "Calls that raised an exception."),
+                ("sql_statements_total", "sql_statements", "SQL statements executed inside the calls."),
+                ("pool_checkouts_total", "pool_checkouts", "Connections checked out of the DB pool inside the calls."),
+                ("api_calls_total", "api_calls", "Bot API requests made inside the calls."),
+            ):
+                lines += [f"# HELP {base}_{metric} {help_text}", f"# TYPE {base}_{metric} counter"]
+                lines += [
+                    f'{base}_{metric}{{name="{name}"}} {getattr(stats, attr)}' for name, stats in sections
+                ]
+
+        lines += [
+            "# HELP experiment_bot_api_requests_total Bot API requests by method.",
+            "# TYPE experiment_bot_api_requests_total counter",
+        ]
+        lines += [
+            f'experiment_bot_api_requests_total{{method="{method}"}} {int(count)}'
+            for method, (count, _) in sorted(self.api_requests.items())
+        ]
+        lines += [
+            "# HELP experiment_bot_api_request_seconds_total Time spent in Bot API requests by method.",
+            "# TYPE experiment_bot_api_request_seconds_total counter",
+        ]
+        lines += [
+            f'experiment_bot_api_request_seconds_total{{method="{method}"}} {total:.6f}'
+            for method, (_, total) in sorted(self.api_requests.items())
+        ]
+
+        if gauges:
+            lines += [
+                "# HELP experiment_bot_runtime Runtime statistics (queue, DB pool, caches).",
+                "# TYPE experiment_bot_runtime gauge",
+            ]
+            lines += [f'experiment_bot_runtime{{stat="{key}"}} {value}' for key, value in sorted(gauges.items())]
+
+        return "\n".join(lines) + "\n"
+
+
+def flatten_numbers(data: Any, prefix: str = "") -> Dict[str, float]:
+    """Числовые листья вложенного словаря: {'db_pool.writer.in_use': 0, ...}."""
+    result: Dict[str, float] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            result.update(flatten_numbers(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        result[prefix.rstrip(".")] = data
+    return result
+
+
+class InstrumentedRequest(BaseRequest):
+    """Обёртка над HTTP-клиентом Bot API, которая считает запросы по методам."""
+
+    def __init__(self, inner: BaseRequest, metrics: Metrics):
+        self.inner = inner
+        self.metrics = metrics
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Optional[float] = None,
+        write_timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        pool_timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        started = time.perf_counter()
+        try:
+            return await self.inner.do_request(
+                url,
+                method,
+                request_data=request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        finally:
+            self.metrics.api_called(url.rsplit("/", 1)[-1], time.perf_counter() - started)
+
+
+class MetricsServer:
+    """
+    Минимальный HTTP-сервер на asyncio, отдающий GET /metrics в формате Prometheus.
+    Рассчитан на локальный сбор (127.0.0.1), а не на публичный доступ.
+    """
+
+    def __init__(self, render: Callable[[], str], host: str = "127.0.0.1", port: int = 9464):
+        self.render = render
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("Метрики доступны на http://%s:%d/metrics", self.host, self.port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их надо дочитать до пустой строки
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("Ошибка при отдаче метрик")
+        finally:
+            writer.close()
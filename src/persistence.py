@@ -0,0 +1,179 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Хранение context.user_data в SQLite, чтобы перезапуск бота не сбрасывал шаг
+участника (stage) и ответы онбординга (participant_name, gender).
+
+SQLitePersistence подключается к Application через .persistence(...).
+Application сам копит изменённые user_data и раз в update_interval секунд
+передаёт их сюда; все изменения одного цикла записываются одной транзакцией.
+Данные сериализуются в компактный JSON (таблица bot_user_data).
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db_pool import DBPool
+
+logger = logging.getLogger("experiment_bot.persistence")
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLitePersistence(BasePersistence):
+    """Персистентность только для user_data; chat_data, bot_data и callback_data не используются."""
+
+    def __init__(self, pool: DBPool, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(
+                user_data=True, chat_data=False, bot_data=False, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self._pool = pool
+        # user_id -> сериализованные данные (None — удалить строку)
+        self._pending: Dict[int, Optional[str]] = {}
+        self._written: Dict[int, str] = {}
+        self._in_flight: Dict[int, Optional[str]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+        self.rows_written = 0
+        self.transactions = 0
+
+    # ------------------------------------------------------------------ чтение
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        async with self._pool.reader() as db:
+            cur = await db.execute("SELECT user_id, data FROM bot_user_data")
+            rows = await cur.fetchall()
+            await cur.close()
+
+        user_data: Dict[int, Dict[str, Any]] = {}
+        for user_id, data in rows:
+            try:
+                user_data[user_id] = json.loads(data)
+            except ValueError:
+                logger.warning("Повреждённые user_data для %s — пропускаю", user_id)
+                continue
+            self._written[user_id] = data
+
+        logger.info("Восстановлены user_data для %d пользователей", len(user_data))
+        return user_data
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    # ------------------------------------------------------------------ запись
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        serialized = _dumps(data) if data else None
+        stored = self._in_flight.get(user_id, self._written.get(user_id))
+        if serialized == stored:
+            # В БД уже (или вот-вот будет) то же самое — отменяем более раннюю незаписанную версию
+            self._pending.pop(user_id, None)
+            return
+        self._pending[user_id] = serialized
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending[user_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def update_bot_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
+        logger.info(
+            "user_data сохранены: %d строк за %d транзакций", self.rows_written, self.transactions
+        )
+
+    def _schedule_write(self):
+        # Application вызывает update_user_data для всех изменённых пользователей
+        # через asyncio.gather — отложенная задача соберёт их в одну транзакцию.
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_soon())
+
+    async def _write_soon(self):
+        await asyncio.sleep(0)
+        try:
+            await self._write_pending()
+        except Exception:
+            logger.exception("Не удалось сохранить user_data")
+
+    async def _write_pending(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._in_flight = batch
+
+        upserts = [(uid, data) for uid, data in batch.items() if data is not None]
+        deletes = [(uid,) for uid, data in batch.items() if data is None]
+
+        try:
+            async with self._pool.writer() as db:
+                if upserts:
+                    await db.executemany(
+                        """
+                        INSERT INTO bot_user_data(user_id, data)
+                        VALUES (?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET data = excluded.data
+                        """,
+                        upserts,
+                    )
+                if deletes:
+                    await db.executemany("DELETE FROM bot_user_data WHERE user_id = ?", deletes)
+                await db.commit()
+        except Exception:
+            # Не теряем изменения: вернём их в очередь, более новые значения важнее
+            self._pending = {**batch, **self._pending}
+            raise
+        finally:
+            self._in_flight = {}
+
+        for uid, data in batch.items():
+            if data is None:
+                self._written.pop(uid, None)
+            else:
+                self._written[uid] = data
+        self.rows_written += len(batch)
+        self.transactions += 1
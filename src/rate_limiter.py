@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Планировщик исходящих запросов к Bot API (BaseRateLimiter для Application).
+
+Telegram принимает от бота порядка 30 сообщений в секунду всего и порядка
+одного сообщения в секунду в один чат (короткие всплески допускаются), а при
+превышении отвечает 429 с RetryAfter. Без ограничения волна участников,
+пришедших одновременно, упирается в этот лимит: обработчики получают
+RetryAfter и повисают.
+
+SendScheduler:
+- ведро токенов на каждый чат (chat_rate, chat_burst) — запросы в один чат;
+- общее ведро токенов бота (global_rate, global_burst) с очередью по приоритету:
+  ответы участникам (INTERACTIVE, по умолчанию) проходят раньше массовых
+  рассылок (BULK, rate_limit_args=BULK у методов бота);
+- RetryAfter: все отправки приостанавливаются на retry_after секунд, запрос
+  повторяется до max_retries раз.
+
+Ограничиваются только запросы, адресованные чату (есть chat_id: отправка и
+редактирование сообщений). answerCallbackQuery, getFile и служебные методы
+проходят сразу. Время ожидания каждого запроса передаётся в on_wait(приоритет,
+секунды) — для metrics.Metrics.observe.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger("experiment_bot.rate_limiter")
+
+# Приоритеты запросов (меньше — раньше)
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+    reserve() занимает токен в долг и возвращает, сколько ждать до его появления,
+    поэтому запросы к одному ведру выстраиваются по порядку без отдельной очереди.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится свободный токен."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendScheduler(BaseRateLimiter[int]):
+    """
+    Использование:
+        app = Application.builder().token(token).rate_limiter(SendScheduler()).build()
+        await bot.send_message(chat_id, text, rate_limit_args=BULK)   # рассылка
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        global_burst: int = 30,
+        chat_rate: float = 1.0,
+        chat_burst: int = 5,
+        max_retries: int = 3,
+        on_wait: Optional[Callable[[str, float], None]] = None,
+    ):
+        if global_rate <= 0 or chat_rate <= 0 or global_burst < 1 or chat_burst < 1:
+            raise ValueError("Лимиты отправки должны быть положительными, а всплеск — не меньше 1")
+        now = time.monotonic()
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.on_wait = on_wait
+
+        self._global = TokenBucket(global_rate, global_burst, now)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._prune_at = 1024
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+
+        self.sent = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.delayed = 0
+        self.wait_max = 0.0
+        self.retry_after_count = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = BULK if rate_limit_args == BULK else INTERACTIVE
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                self.retry_after_count += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + float(e.retry_after))
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(
+                    "Bot API: превышен лимит (%s, чат %s), отправка приостановлена на %s с, повтор %d из %d",
+                    endpoint, chat_id, e.retry_after, attempt, self.max_retries,
+                )
+
+    def _chat_bucket(self, chat_id: Union[int, str], now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                # Полное ведро ничем не отличается от нового — его можно забыть
+                self._chats = {key: b for key, b in self._chats.items() if not b.full(now)}
+                self._prune_at = max(1024, 2 * len(self._chats))
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    async def _acquire(self, chat_id: Union[int, str], priority: int):
+        started = time.monotonic()
+        delay = self._chat_bucket(chat_id, started).reserve(started)
+        delayed = delay > 0
+        if delayed:
+            await asyncio.sleep(delay)
+
+        now = time.monotonic()
+        if not self._waiters and now >= self._paused_until and self._global.delay(now) == 0:
+            self._global.take(now)
+        else:
+            delayed = True
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            await future
+
+        waited = time.monotonic() - started
+        name = PRIORITY_NAMES[priority]
+        self.sent[name] += 1
+        if delayed:
+            self.delayed += 1
+            self.wait_max = max(self.wait_max, waited)
+        if self.on_wait is not None:
+            self.on_wait(name, waited)
+
+    async def _dispatch(self):
+        """Выдаёт токены общего ведра ожидающим по приоритету, затем по порядку прихода."""
+        while self._waiters:
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._global.delay(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # ожидавший запрос отменён
+                continue
+            self._global.take(now)
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(not future.done() for _, _, future in self._waiters),
+            "chats_tracked": len(self._chats),
+            "sent": dict(self.sent),
+            "delayed": self.delayed,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "retry_after": self.retry_after_count,
+            "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
@@ -2,23 +2,65 @@
 # -*- coding: utf-8 -*-
 
 """
-Экспорт результатов эксперимента из SQLite-базы (ratings.db) в Excel-файл.
+Экспорт результатов эксперимента из SQLite-базы (ratings.db) в Excel-файл
+или в колоночные форматы для анализа (Parquet, Feather, CSV.gz).
 
 Структура Excel-файла:
 - Лист "participants" — участники (личные данные и статус).
 - Лист "answers"      — ответы по каждому видео для каждого участника.
+- Лист "answers_wide" — те же ответы, по строке на участника: для каждого
+  сценария колонки <сценарий>_position, _description, _adv_behavior,
+  _adv_choice, _rating.
 
 Запуск:
     python export_to_excel.py
+    python export_to_excel.py --stream   # для больших исследований
+    python export_to_excel.py --incremental   # обновить файл во время исследования
+    python export_to_excel.py --format parquet   # для pandas / R / DuckDB
 
 Файл будет сохранён как:
     <корень проекта>/data/experiment_results.xlsx
+
+В режиме --incremental файл целиком пересобирается (потоково), только если с
+прошлого запуска изменились участники или ответы (по колонкам updated_at;
+отметка хранится рядом, в experiment_results.xlsx.state.json). Отдельного файла
+с изменениями не создаётся. Без изменений запуск занимает доли секунды — удобно
+обновлять результаты по расписанию.
+
+В режиме --stream строки читаются курсором SQLite порциями по --chunk-size и
+сразу пишутся в книгу (xlsxwriter constant_memory, если он установлен, иначе
+openpyxl write-only), поэтому память не растёт с числом ответов. Без --stream
+обе таблицы целиком загружаются в pandas.
+
+С --format parquet | feather | csv.gz вместо книги пишутся три файла,
+experiment_results.participants.<ext>, .answers.<ext> и .answers_wide.<ext>
+с типизированными колонками (см. columnar_export.py). --incremental работает
+и для них.
 """
 
+import argparse
+import json
 import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+try:
+    import xlsxwriter  # необязательный, более быстрый движок для --stream
+except ImportError:
+    xlsxwriter = None
+
+XLSXWRITER_REQUIREMENT = "xlsxwriter==3.1.9"
+
+from columnar_export import FORMATS, output_path, require_pyarrow, with_format, write_table
+from scenarios import SCENARIOS, permutation_rows
 
 
 # Пути — такие же уровнем, как в tg_bot.py
@@ -27,12 +69,7 @@ DB_PATH = BASE_DIR / "data" / "ratings.db"
 OUT_PATH = BASE_DIR / "data" / "experiment_results.xlsx"
 
 
-def load_participants(conn: sqlite3.Connection) -> pd.DataFrame:
-    """
-    Загрузить краткий список участников:
-    user_id, tg_username, first_name, participant_name, gender, age, condition, completed, created_at.
-    """
-    query = """
+PARTICIPANTS_QUERY = """
     SELECT
         user_id,
         tg_username,
@@ -45,13 +82,81 @@ def load_participants(conn: sqlite3.Connection) -> pd.DataFrame:
         created_at
     FROM participants
     ORDER BY user_id;
+"""
+
+# Сколько строк читать из курсора за раз в режиме --stream
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def load_participants(conn: sqlite3.Connection) -> pd.DataFrame:
     """
-    return pd.read_sql_query(query, conn)
+    Загрузить краткий список участников:
+    user_id, tg_username, first_name, participant_name, gender, age, condition, completed, created_at.
+    """
+    return pd.read_sql_query(PARTICIPANTS_QUERY, conn)
 
 
-def load_answers(conn: sqlite3.Connection) -> pd.DataFrame:
+def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+@dataclass(frozen=True)
+class VideoPositions:
+    """
+    Порядок видео каждого участника в виде фрагментов SQL для запросов экспорта:
+    with_clause — CTE (или пустая строка), joins — LEFT JOIN к participants p,
+    position и scenario — выражения позиции и сценария видео в этих JOIN.
+    """
+
+    with_clause: str
+    joins: str
+    position: str
+    scenario: str
+    params: List
+
+
+def video_positions(conn: sqlite3.Connection) -> VideoPositions:
+    """
+    Участники с номером перестановки (participants.video_order, режим 'permutation'
+    в tg_bot.py) разворачиваются по таблице перестановок из scenarios.py,
+    остальные берутся из строк video_sequence.
+
+    Оба источника присоединяются к participants напрямую (а не через общий CTE с
+    UNION ALL): тогда SQLite идёт по participants в порядке первичного ключа и
+    ищет строки по индексам, а не материализует все позиции во временную таблицу
+    с автоматическим индексом и не сортирует весь результат.
+    """
+    if not has_column(conn, "participants", "video_order"):
+        return VideoPositions(
+            with_clause="",
+            joins="""
+    LEFT JOIN video_sequence vs
+        ON vs.user_id = p.user_id""",
+            position="vs.position",
+            scenario="vs.scenario",
+            params=[],
+        )
+
+    rows = permutation_rows()
+    values = ", ".join("(?, ?, ?)" for _ in rows)
+    return VideoPositions(
+        with_clause=f"WITH perm_positions(video_order, position, scenario) AS (VALUES {values})",
+        joins="""
+    LEFT JOIN perm_positions
+        ON p.video_order IS NOT NULL
+       AND perm_positions.video_order = p.video_order
+    LEFT JOIN video_sequence vs
+        ON p.video_order IS NULL
+       AND vs.user_id = p.user_id""",
+        position="COALESCE(perm_positions.position, vs.position)",
+        scenario="COALESCE(perm_positions.scenario, vs.scenario)",
+        params=[value for row in rows for value in row],
+    )
+
+
+def answers_query(conn: sqlite3.Connection) -> Tuple[str, List]:
     """
-    Собрать таблицу ответов:
+    Запрос таблицы ответов:
     одна строка = один пользователь × одно видео.
 
     Поля:
@@ -75,7 +180,9 @@ def load_answers(conn: sqlite3.Connection) -> pd.DataFrame:
     - current_video_idx
     - completed
     """
-    query = """
+    v = video_positions(conn)
+    query = f"""
+    {v.with_clause}
     SELECT
         p.user_id,
         p.tg_username,
@@ -85,52 +192,468 @@ def load_answers(conn: sqlite3.Connection) -> pd.DataFrame:
         p.age,
         p.condition,
 
-        v.position        AS video_position,
-        v.scenario        AS video_scenario,
+        {v.position} AS video_position,
+        {v.scenario} AS video_scenario,
 
         a.description     AS answer_description,
         a.adv_behavior    AS answer_adv_behavior,
         a.adv_choice      AS answer_adv_choice,
         a.scenario_rating AS answer_scenario_rating
 
-    FROM participants p
-    LEFT JOIN video_sequence v
-        ON v.user_id = p.user_id
+    FROM participants p{v.joins}
     LEFT JOIN answers a
         ON a.user_id = p.user_id
-       AND a.position = v.position
+       AND a.position = {v.position}
 
-    ORDER BY p.user_id, v.position;
+    ORDER BY p.user_id, video_position;
     """
-    return pd.read_sql_query(query, conn)
+    return query, v.params
 
 
-def main():
-    if not DB_PATH.exists():
-        raise FileNotFoundError(f"База данных не найдена: {DB_PATH}")
+def load_answers(conn: sqlite3.Connection) -> pd.DataFrame:
+    query, params = answers_query(conn)
+    return pd.read_sql_query(query, conn, params=params)
+
+
+# Колонки широкой таблицы для каждого сценария: суффикс → выражение в запросе
+# ({position} — выражение позиции видео из VideoPositions)
+WIDE_FIELDS = (
+    ("position", "{position}"),
+    ("description", "a.description"),
+    ("adv_behavior", "a.adv_behavior"),
+    ("adv_choice", "a.adv_choice"),
+    ("rating", "a.scenario_rating"),
+)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def answers_wide_query(conn: sqlite3.Connection) -> Tuple[str, List]:
+    """
+    Запрос широкой таблицы ответов: одна строка = один участник,
+    для каждого сценария из SCENARIOS — колонки <сценарий>_position,
+    _description, _adv_behavior, _adv_choice, _rating.
+
+    Разворот делается в SQLite условной агрегацией (MAX(CASE ...) с GROUP BY
+    по user_id): строки ответов читаются один раз, в порядке первичного ключа,
+    без pivot в pandas.
+    """
+    v = video_positions(conn)
+    params = list(v.params)
+    columns = []
+    for scenario in SCENARIOS:
+        for suffix, expr in WIDE_FIELDS:
+            expr = expr.format(position=v.position)
+            columns.append(f"MAX(CASE WHEN {v.scenario} = ? THEN {expr} END) AS {_quote(f'{scenario}_{suffix}')}")
+            params.append(scenario)
+    pivot = ",\n        ".join(columns)
+    query = f"""
+    {v.with_clause}
+    SELECT
+        p.user_id,
+        p.tg_username,
+        p.first_name,
+        p.participant_name,
+        p.gender,
+        p.age,
+        p.condition,
+        p.completed,
+
+        {pivot}
+
+    FROM participants p{v.joins}
+    LEFT JOIN answers a
+        ON a.user_id = p.user_id
+       AND a.position = {v.position}
+
+    GROUP BY p.user_id
+    ORDER BY p.user_id;
+    """
+    return query, params
+
+
+def load_answers_wide(conn: sqlite3.Connection) -> pd.DataFrame:
+    query, params = answers_wide_query(conn)
+    return pd.read_sql_query(query, conn, params=params)
+
+
+class StreamingWorkbook:
+    """
+    Книга Excel, в которую строки дописываются по одной и не копятся в памяти.
+
+    engine='xlsxwriter' — xlsxwriter в режиме constant_memory (примерно вдвое
+    быстрее, нужен пакет xlsxwriter); engine='openpyxl' — write-only книга
+    openpyxl. Текст, начинающийся с '=', записывается строкой, а не формулой:
+    в ответах участников может оказаться что угодно.
+    """
+
+    def __init__(self, out_path: Path, engine: str = "openpyxl"):
+        self.engine = engine
+        self.out_path = out_path
+        if engine == "xlsxwriter":
+            if xlsxwriter is None:
+                raise RuntimeError(
+                    f"Движок xlsxwriter недоступен: pip install {XLSXWRITER_REQUIREMENT} "
+                    "(или pip install -r requirements-export.txt)"
+                )
+            self._book = xlsxwriter.Workbook(
+                str(out_path),
+                {"constant_memory": True, "strings_to_formulas": False, "strings_to_urls": False},
+            )
+            self._bold = self._book.add_format({"bold": True})
+        elif engine == "openpyxl":
+            self._book = Workbook(write_only=True)
+        else:
+            raise ValueError(f"Неизвестный движок Excel: {engine}")
+
+    def add_sheet(self, name: str, header: List[str]) -> Callable[[Tuple], None]:
+        """Создаёт лист с жирным заголовком (как у pandas.to_excel); возвращает функцию добавления строки."""
+        if self.engine == "xlsxwriter":
+            sheet = self._book.add_worksheet(name)
+            sheet.write_row(0, 0, header, self._bold)
+            next_row = iter(range(1, 1_048_576))
+
+            def append(row: Tuple):
+                sheet.write_row(next(next_row), 0, row)
+
+            return append
+
+        sheet = self._book.create_sheet(name)
+        header_cells = []
+        for title in header:
+            cell = WriteOnlyCell(sheet, value=title)
+            cell.font = Font(bold=True)
+            header_cells.append(cell)
+        sheet.append(header_cells)
+
+        def as_text(value):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.data_type = "s"
+            return cell
+
+        def append(row: Tuple):
+            if any(isinstance(v, str) and v.startswith("=") for v in row):
+                row = [as_text(v) if isinstance(v, str) and v.startswith("=") else v for v in row]
+            sheet.append(row)
+
+        return append
+
+    def close(self):
+        if self.engine == "xlsxwriter":
+            self._book.close()
+        else:
+            self._book.save(self.out_path)
+
+
+def default_excel_engine() -> str:
+    return "xlsxwriter" if xlsxwriter is not None else "openpyxl"
+
+
+def stream_to_sheet(
+    conn: sqlite3.Connection,
+    workbook: StreamingWorkbook,
+    sheet_name: str,
+    query: str,
+    params: List = (),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Пишет результат запроса на новый лист, читая курсор порциями по
+    chunk_size строк. Возвращает число записанных строк.
+    """
+    cur = conn.execute(query, params)
+    try:
+        append = workbook.add_sheet(sheet_name, [column[0] for column in cur.description])
+        written = 0
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                append(row)
+            written += len(rows)
+        return written
+    finally:
+        cur.close()
+
+
+def export_streaming(
+    conn: sqlite3.Connection,
+    out_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: Optional[str] = None,
+):
+    """Экспорт обоих листов без загрузки таблиц в память целиком."""
+    workbook = StreamingWorkbook(out_path, engine or default_excel_engine())
+    print(f"Движок Excel: {workbook.engine}")
+
+    print("Пишу лист participants...")
+    count = stream_to_sheet(conn, workbook, "participants", PARTICIPANTS_QUERY, chunk_size=chunk_size)
+    print(f"  строк: {count}")
+
+    print("Пишу лист answers...")
+    query, params = answers_query(conn)
+    count = stream_to_sheet(conn, workbook, "answers", query, params, chunk_size=chunk_size)
+    print(f"  строк: {count}")
+
+    print("Пишу лист answers_wide...")
+    query, params = answers_wide_query(conn)
+    count = stream_to_sheet(conn, workbook, "answers_wide", query, params, chunk_size=chunk_size)
+    print(f"  строк: {count}")
+
+    print(f"Сохраняю Excel-файл: {out_path}")
+    workbook.close()
+
+
+def export_columnar(
+    conn: sqlite3.Connection,
+    out_path: Path,
+    fmt: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """Экспорт обеих таблиц в отдельные файлы формата fmt с типизированными колонками."""
+    require_pyarrow(fmt)
+    for table, (table_query, table_params) in (
+        ("participants", (PARTICIPANTS_QUERY, [])),
+        ("answers", answers_query(conn)),
+        ("answers_wide", answers_wide_query(conn)),
+    ):
+        path = output_path(out_path, table, fmt)
+        print(f"Пишу {path}...")
+        count = write_table(conn, table, table_query, table_params, path, fmt, chunk_size)
+        print(f"  строк: {count}")
+
+
+def export_outputs(out_path: Path, fmt: str) -> List[Path]:
+    """Файлы, которые создаёт экспорт в формате fmt."""
+    if fmt == "xlsx":
+        return [out_path]
+    return [output_path(out_path, table, fmt) for table in ("participants", "answers", "answers_wide")]
+
+
+def state_path(out_path: Path) -> Path:
+    """Файл с отметкой последнего экспорта лежит рядом с результатом."""
+    return out_path.with_name(out_path.name + ".state.json")
+
+
+def load_state(out_path: Path, outputs: List[Path]) -> Optional[Dict[str, Any]]:
+    path = state_path(out_path)
+    if not all(output.exists() for output in outputs) or not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(
+    out_path: Path, db_path: Path, marker: Tuple[int, int], high_water_rows: Dict[str, List[str]]
+):
+    state = {
+        "db": str(db_path.resolve()),
+        "high_water_ms": marker[0],
+        "rows_at_high_water": marker[1],
+        "high_water_rows": high_water_rows,
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    state_path(out_path).write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def change_marker(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """
+    Отметка состояния данных: самое позднее updated_at среди участников и ответов
+    (мс, 0 — если отметок нет) и число строк с этим updated_at. Второе число ловит
+    запись, зафиксированную в ту же миллисекунду уже после прошлого экспорта.
+    Оба запроса идут по индексам на updated_at (см. create_schema_and_fill в tg_bot.py).
+    """
+    (high_water,) = conn.execute(
+        """
+        SELECT MAX(
+            COALESCE((SELECT MAX(updated_at) FROM participants), 0),
+            COALESCE((SELECT MAX(updated_at) FROM answers), 0)
+        )
+        """
+    ).fetchone()
+    (rows,) = conn.execute(
+        """
+        SELECT (SELECT COUNT(*) FROM participants WHERE updated_at = :mark)
+             + (SELECT COUNT(*) FROM answers WHERE updated_at = :mark)
+        """,
+        {"mark": high_water},
+    ).fetchone()
+    return high_water, rows
+
+
+def high_water_rows(conn: sqlite3.Connection, mark_ms: int) -> Dict[str, List[str]]:
+    """
+    Строки с updated_at = mark_ms: user_id участников и "user_id:position" ответов.
+    Сохраняются в отметке, чтобы в следующий раз отличить уже выгруженные строки
+    от записанных в ту же миллисекунду после экспорта.
+    """
+    participants = conn.execute("SELECT user_id FROM participants WHERE updated_at = ?", (mark_ms,))
+    answers = conn.execute("SELECT user_id, position FROM answers WHERE updated_at = ?", (mark_ms,))
+    return {
+        "participants": [str(user_id) for (user_id,) in participants],
+        "answers": [f"{user_id}:{position}" for user_id, position in answers],
+    }
+
+
+def count_changed_participants(
+    conn: sqlite3.Connection, since_ms: int, exported: Optional[Dict[str, List[str]]] = None
+) -> int:
+    """
+    Участники, у которых после since_ms изменилась анкета или хотя бы один ответ.
+    Строки ровно с since_ms считаются изменившимися, только если их нет в exported
+    (high_water_rows() прошлого экспорта); без exported — все такие строки.
+    """
+    changed = {
+        user_id
+        for (user_id,) in conn.execute(
+            """
+            SELECT user_id FROM participants WHERE updated_at > :since
+            UNION
+            SELECT user_id FROM answers WHERE updated_at > :since
+            """,
+            {"since": since_ms},
+        )
+    }
+    ties = high_water_rows(conn, since_ms)
+    exported = exported or {}
+    exported_participants = set(exported.get("participants", ()))
+    exported_answers = set(exported.get("answers", ()))
+    changed.update(int(key) for key in ties["participants"] if key not in exported_participants)
+    changed.update(int(key.split(":")[0]) for key in ties["answers"] if key not in exported_answers)
+    return len(changed)
+
 
-    print(f"Открываю БД: {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH)
+def export_incremental(
+    conn: sqlite3.Connection,
+    db_path: Path,
+    out_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: Optional[str] = None,
+    fmt: str = "xlsx",
+) -> bool:
+    """
+    Пересобирает файл целиком, только если данные изменились с прошлого запуска
+    (по колонкам updated_at). Возвращает True, если файл был перезаписан.
+
+    Изменившиеся строки не правятся в существующем .xlsx на месте: файл — это
+    zip-архив, и openpyxl всё равно перечитывает и пересохраняет его целиком, что
+    в несколько раз медленнее потоковой выгрузки всех строк из БД заново.
+
+    Отметка и данные берутся из одного снимка БД (одна транзакция чтения), поэтому
+    записи, сделанные ботом во время экспорта, попадут в следующий запуск.
+    """
+    if not (has_column(conn, "participants", "updated_at") and has_column(conn, "answers", "updated_at")):
+        raise RuntimeError(
+            "В базе нет колонок updated_at: запустите текущую версию бота (он добавит их) "
+            "или выполните полный экспорт без --incremental"
+        )
 
+    state = load_state(out_path, export_outputs(out_path, fmt))
+    conn.execute("BEGIN")
     try:
-        print("Читаю таблицу участников...")
-        participants_df = load_participants(conn)
+        marker = change_marker(conn)
 
-        print("Собираю таблицу ответов...")
-        answers_df = load_answers(conn)
+        if state is None or state.get("db") != str(db_path.resolve()):
+            print("Отметки прошлого экспорта нет — полный экспорт")
+        else:
+            previous = (state.get("high_water_ms"), state.get("rows_at_high_water"))
+            if marker == previous:
+                print("Данные не изменились с прошлого экспорта — файл актуален")
+                return False
+            changed = count_changed_participants(conn, previous[0], state.get("high_water_rows"))
+            print(f"Изменившихся участников с прошлого экспорта: {changed}")
 
+        if fmt == "xlsx":
+            export_streaming(conn, out_path, chunk_size=chunk_size, engine=engine)
+        else:
+            export_columnar(conn, out_path, fmt, chunk_size=chunk_size)
+        save_state(out_path, db_path, marker, high_water_rows(conn, marker[0]))
+        return True
     finally:
-        conn.close()
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт результатов эксперимента в Excel и колоночные форматы")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="файл базы данных")
+    parser.add_argument(
+        "--out",
+        type=Path,
+        help="куда сохранить .xlsx (для других форматов — основа имён файлов, по умолчанию data/experiment_results)",
+    )
+    parser.add_argument(
+        "--format",
+        dest="fmt",
+        choices=["xlsx", *FORMATS],
+        default="xlsx",
+        help="формат результата: Excel или колоночный (parquet и feather требуют pyarrow)",
+    )
+    parser.add_argument("--stream", action="store_true", help="потоковый экспорт порциями (для больших баз)")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "пересобрать файл целиком, только если данные изменились с прошлого запуска "
+            "(файла только с изменениями не создаётся)"
+        ),
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="строк за одно чтение в режиме --stream")
+    parser.add_argument(
+        "--engine",
+        choices=["xlsxwriter", "openpyxl"],
+        help="движок для --stream (по умолчанию xlsxwriter, если установлен)",
+    )
+    args = parser.parse_args()
+
+    db_path, fmt = args.db, args.fmt
+    out_path = args.out or OUT_PATH
+    if fmt != "xlsx":
+        # Отметка --incremental для каждого формата своя: experiment_results.parquet.state.json
+        out_path = with_format(out_path, fmt)
+    if not db_path.exists():
+        raise FileNotFoundError(f"База данных не найдена: {db_path}")
+    require_pyarrow(fmt)
 
     # Убедимся, что папка data существует
-    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    print(f"Открываю БД: {db_path}")
+    conn = sqlite3.connect(db_path)
+
+    try:
+        if args.incremental:
+            export_incremental(
+                conn, db_path, out_path, chunk_size=args.chunk_size, engine=args.engine, fmt=fmt
+            )
+        elif fmt != "xlsx":
+            export_columnar(conn, out_path, fmt, chunk_size=args.chunk_size)
+        elif args.stream:
+            export_streaming(conn, out_path, chunk_size=args.chunk_size, engine=args.engine)
+        else:
+            print("Читаю таблицу участников...")
+            participants_df = load_participants(conn)
 
-    print(f"Сохраняю Excel-файл: {OUT_PATH}")
-    with pd.ExcelWriter(OUT_PATH, engine="openpyxl") as writer:
-        participants_df.to_excel(writer, sheet_name="participants", index=False)
-        answers_df.to_excel(writer, sheet_name="answers", index=False)
+            print("Собираю таблицу ответов...")
+            answers_df = load_answers(conn)
+
+            print("Собираю широкую таблицу ответов...")
+            answers_wide_df = load_answers_wide(conn)
+
+            print(f"Сохраняю Excel-файл: {out_path}")
+            with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+                participants_df.to_excel(writer, sheet_name="participants", index=False)
+                answers_df.to_excel(writer, sheet_name="answers", index=False)
+                answers_wide_df.to_excel(writer, sheet_name="answers_wide", index=False)
+    finally:
+        conn.close()
 
-    print("Готово ✅")
+    print(f"Готово ✅ ({time.perf_counter() - started:.1f} с)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Какие типы апдейтов запрашивать у Telegram.
+
+allowed_updates_for() выводит минимальный список allowed_updates из
+зарегистрированных обработчиков, чтобы Telegram не присылал апдейты, которые
+бот всё равно не обрабатывает (редактирования, изменения участников чатов,
+опросы и т.д.). DroppedUpdates считает апдейты, не доставшиеся ни одному
+обработчику, по типам.
+"""
+
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+
+from telegram import Update
+from telegram.ext import (
+    Application,
+    BaseHandler,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    TypeHandler,
+)
+
+logger = logging.getLogger("experiment_bot.routing")
+
+# Типы апдейтов, которые обслуживает каждый вид обработчика в этом боте.
+# Бот работает только в личных чатах и не реагирует на редактирование сообщений,
+# поэтому для сообщений достаточно Update.MESSAGE (без edited_message/channel_post).
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: [Update.MESSAGE],
+    MessageHandler: [Update.MESSAGE],
+    CallbackQueryHandler: [Update.CALLBACK_QUERY],
+}
+
+
+def allowed_updates_for(app: Application) -> List[str]:
+    """Минимальный allowed_updates для обработчиков app; для неизвестных — все типы."""
+    allowed: List[str] = []
+    for group in sorted(app.handlers):
+        for handler in app.handlers[group]:
+            types = next(
+                (t for cls, t in HANDLER_UPDATE_TYPES.items() if isinstance(handler, cls)),
+                None,
+            )
+            if types is None:
+                logger.warning(
+                    "Не знаю, какие апдейты нужны обработчику %s — запрашиваю все типы",
+                    type(handler).__name__,
+                )
+                return list(Update.ALL_TYPES)
+            allowed += [t for t in types if t not in allowed]
+    return allowed
+
+
+def update_type(update: object) -> str:
+    if not isinstance(update, Update):
+        return type(update).__name__
+    for name in Update.ALL_TYPES:
+        if getattr(update, name, None) is not None:
+            return str(name)
+    return "unknown"
+
+
+class DroppedUpdates:
+    """Счётчик апдейтов, которые не подошли ни одному обработчику (по типам)."""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def install(self, app: Application, group: int = 0):
+        """
+        Добавляет «последний» обработчик в группу: внутри группы срабатывает только
+        первый подходящий обработчик, так что сюда попадают лишь необработанные апдейты.
+        Вызывать после регистрации всех остальных обработчиков этой группы.
+        """
+        handler: BaseHandler = TypeHandler(object, self._count)
+        app.add_handler(handler, group=group)
+
+    async def _count(self, update: object, context: ContextTypes.DEFAULT_TYPE):
+        kind = update_type(update)
+        if not self.counts[kind]:
+            logger.info("Первый необработанный апдейт типа %s", kind)
+        self.counts[kind] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts)
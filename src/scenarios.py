@@ -0,0 +1,44 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сценарии эксперимента и все возможные порядки их показа.
+
+Модуль общий для tg_bot.py и read_db.py: вместо четырёх строк video_sequence
+на участника можно хранить номер перестановки (participants.video_order),
+а порядок сценариев восстанавливать по таблице SCENARIO_PERMUTATIONS.
+
+ВАЖНО: номер перестановки зависит от порядка элементов SCENARIOS. Если в базе
+уже есть участники с video_order, список SCENARIOS менять нельзя.
+"""
+
+import itertools
+import random
+from typing import List, Tuple
+
+# Сценарии
+SCENARIOS = ["Пицца", "Наперстки", "Детали", "Шахматы"]
+
+# Все порядки показа сценариев (4! = 24), номер = индекс в кортеже
+SCENARIO_PERMUTATIONS: Tuple[Tuple[str, ...], ...] = tuple(itertools.permutations(SCENARIOS))
+
+
+def random_video_order() -> int:
+    """Случайный номер перестановки (равновероятно, как random.shuffle)."""
+    return random.randrange(len(SCENARIO_PERMUTATIONS))
+
+
+def scenario_order(video_order: int) -> Tuple[str, ...]:
+    """Сценарии по позициям для номера перестановки."""
+    if not 0 <= video_order < len(SCENARIO_PERMUTATIONS):
+        raise ValueError(f"Неизвестный номер порядка видео: {video_order}")
+    return SCENARIO_PERMUTATIONS[video_order]
+
+
+def permutation_rows() -> List[Tuple[int, int, str]]:
+    """Развёрнутая таблица (video_order, position, scenario) для SQL-запросов экспорта."""
+    return [
+        (order, position, scenario)
+        for order, scenarios in enumerate(SCENARIO_PERMUTATIONS)
+        for position, scenario in enumerate(scenarios)
+    ]
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кэш состояния участников в памяти процесса бота.
+
+Бот — единственный писатель в ratings.db, поэтому хелперы tg_bot.py могут
+отдавать участника, порядок видео и ответы из памяти, а при записи обновлять
+или сбрасывать соответствующие записи кэша (write-through). TTL ограничивает
+время жизни записей на случай ручных правок базы.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Маркер отсутствия записи: None — допустимое закэшированное значение
+# («участника нет в БД»), поэтому для промаха нужен отдельный объект.
+MISSING = object()
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш со временем жизни записей и счётчиками попаданий."""
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """Как get(), но без учёта в счётчиках и без продления LRU."""
+        item = self._data.get(key)
+        if item is None or item[0] <= self._clock():
+            return MISSING
+        return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+        }
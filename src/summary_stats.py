@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сводная статистика эксперимента, которая поддерживается в БД на лету.
+
+Таблицы:
+- stats_conditions(condition, participants, completed) — участники и завершившие
+  по условию ('' — условие ещё не назначено);
+- stats_ratings(scenario, rating, answers) — гистограмма оценок по сценариям.
+
+Счётчики меняют триггеры на participants и answers, поэтому они обновляются в той
+же транзакции, что и сама запись (create_participant, update_participant_progress,
+upsert_answer_field и пакетная запись AnswerWriteBuffer), и не расходятся с
+данными при откате. Чтение сводки — несколько десятков строк, без просмотра answers.
+"""
+
+from typing import Any, Dict, List
+
+import aiosqlite
+
+SUMMARY_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS stats_conditions (
+        condition    TEXT PRIMARY KEY,
+        participants INTEGER NOT NULL DEFAULT 0,
+        completed    INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_ratings (
+        scenario TEXT NOT NULL,
+        rating   INTEGER NOT NULL,
+        answers  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scenario, rating)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def _condition_delta(row: str, sign: str) -> str:
+    """Прибавить (sign='+') или вычесть участника row (NEW/OLD) в stats_conditions."""
+    return f"""
+        INSERT INTO stats_conditions(condition, participants, completed)
+        VALUES (COALESCE({row}.condition, ''), {sign}1, {sign}({row}.completed != 0))
+        ON CONFLICT(condition) DO UPDATE SET
+            participants = participants {sign} 1,
+            completed    = completed {sign} ({row}.completed != 0);"""
+
+
+def _rating_delta(row: str, sign: str) -> str:
+    """Прибавить или вычесть оценку из ответа row (NEW/OLD) в stats_ratings."""
+    return f"""
+        INSERT INTO stats_ratings(scenario, rating, answers)
+        SELECT {row}.scenario, {row}.scenario_rating, {sign}1
+        WHERE {row}.scenario_rating IS NOT NULL
+        ON CONFLICT(scenario, rating) DO UPDATE SET answers = answers {sign} 1;"""
+
+
+SUMMARY_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_participants_insert
+    AFTER INSERT ON participants
+    BEGIN {_condition_delta("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_participants_update
+    AFTER UPDATE OF condition, completed ON participants
+    WHEN OLD.condition IS NOT NEW.condition OR OLD.completed IS NOT NEW.completed
+    BEGIN {_condition_delta("OLD", "-")} {_condition_delta("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_participants_delete
+    AFTER DELETE ON participants
+    BEGIN {_condition_delta("OLD", "-")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_answers_insert
+    AFTER INSERT ON answers
+    BEGIN {_rating_delta("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_answers_update
+    AFTER UPDATE OF scenario, scenario_rating ON answers
+    WHEN OLD.scenario IS NOT NEW.scenario OR OLD.scenario_rating IS NOT NEW.scenario_rating
+    BEGIN {_rating_delta("OLD", "-")} {_rating_delta("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_answers_delete
+    AFTER DELETE ON answers
+    BEGIN {_rating_delta("OLD", "-")}
+    END
+    """,
+)
+
+
+async def create_summary_tables(db: aiosqlite.Connection):
+    """
+    Создаёт таблицы сводки и триггеры. Если таблиц ещё не было (новая база или
+    база предыдущей версии бота), счётчики один раз пересчитываются по данным.
+    Коммит — на вызывающем (create_schema_and_fill).
+    """
+    cur = await db.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('stats_conditions', 'stats_ratings')"
+    )
+    (existing,) = await cur.fetchone()
+    await cur.close()
+
+    for statement in SUMMARY_TABLES + SUMMARY_TRIGGERS:
+        await db.execute(statement)
+    if existing < 2:
+        await rebuild_summary(db)
+
+
+async def rebuild_summary(db: aiosqlite.Connection):
+    """Пересчитывает счётчики по participants и answers целиком (полный просмотр таблиц)."""
+    await db.execute("DELETE FROM stats_conditions")
+    await db.execute(
+        """
+        INSERT INTO stats_conditions(condition, participants, completed)
+        SELECT COALESCE(condition, ''), COUNT(*), SUM(completed != 0)
+        FROM participants
+        GROUP BY COALESCE(condition, '')
+        """
+    )
+    await db.execute("DELETE FROM stats_ratings")
+    await db.execute(
+        """
+        INSERT INTO stats_ratings(scenario, rating, answers)
+        SELECT scenario, scenario_rating, COUNT(*)
+        FROM answers
+        WHERE scenario_rating IS NOT NULL
+        GROUP BY scenario, scenario_rating
+        """
+    )
+
+
+async def load_summary(db: aiosqlite.Connection) -> Dict[str, Any]:
+    """
+    Сводка из таблиц stats_*:
+    {"conditions": {условие: {"participants", "completed"}},
+     "ratings": {сценарий: {"answers", "mean", "histogram": {оценка: число}}}}
+    """
+    cur = await db.execute(
+        "SELECT condition, participants, completed FROM stats_conditions ORDER BY condition"
+    )
+    conditions = {
+        condition: {"participants": participants, "completed": completed}
+        for condition, participants, completed in await cur.fetchall()
+        if participants
+    }
+    await cur.close()
+
+    cur = await db.execute(
+        "SELECT scenario, rating, answers FROM stats_ratings WHERE answers > 0 ORDER BY scenario, rating"
+    )
+    ratings: Dict[str, Dict[str, Any]] = {}
+    for scenario, rating, answers in await cur.fetchall():
+        entry = ratings.setdefault(scenario, {"answers": 0, "mean": None, "histogram": {}})
+        entry["histogram"][rating] = answers
+        entry["answers"] += answers
+    await cur.close()
+
+    for entry in ratings.values():
+        total = sum(rating * count for rating, count in entry["histogram"].items())
+        entry["mean"] = round(total / entry["answers"], 2)
+
+    return {"conditions": conditions, "ratings": ratings}
+
+
+def format_summary(summary: Dict[str, Any], scenarios: List[str]) -> str:
+    """Текст ответа на /stats."""
+    conditions = summary["conditions"]
+    started = sum(c["participants"] for c in conditions.values())
+    completed = sum(c["completed"] for c in conditions.values())
+    lines = [f"📊 Участников: {started}, завершили: {completed}", ""]
+
+    for condition, counts in conditions.items():
+        title = f"условие «{condition}»" if condition else "условие ещё не назначено"
+        lines.append(f"• {title}: {counts['participants']} (завершили {counts['completed']})")
+
+    lines += ["", "Оценки сценариев (среднее, число ответов, гистограмма 1…10):"]
+    for scenario in scenarios:
+        entry = summary["ratings"].get(scenario)
+        if not entry:
+            lines.append(f"• {scenario}: оценок пока нет")
+            continue
+        histogram = " ".join(str(entry["histogram"].get(r, 0)) for r in range(1, 11))
+        lines.append(f"• {scenario}: {entry['mean']:.2f} (n={entry['answers']}) [{histogram}]")
+    return "\n".join(lines)
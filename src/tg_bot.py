@@ -3,18 +3,18 @@
 
 import asyncio
 import logging
+import os
 import random
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 
 import aiosqlite
 import nest_asyncio
-from telegram import (
-    Update,
-    InlineKeyboardMarkup,
-    InlineKeyboardButton,
-)
+from telegram import Bot, CallbackQuery, Update
 from telegram.error import BadRequest
+from telegram.request import BaseRequest, HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -24,6 +24,21 @@ from telegram.ext import (
     filters,
 )
 
+from answer_writer import ANSWER_FIELDS, AnswerWriteBuffer, answer_upsert_sql
+from concurrency import PerUserLocks, serialized_per_user
+from db_pool import NOW_MS_SQL, DBPool
+from keyboards import GENDER_KEYBOARD, LIKERT_KEYBOARD
+from logging_setup import setup_logging
+from messages import GENDER_CHOSEN, MARKDOWN_TEXTS, RATING_QUESTIONS, TEXTS, final_message, video_caption
+from metrics import InstrumentedRequest, Metrics, MetricsServer, flatten_numbers
+from persistence import SQLitePersistence
+from rate_limiter import SendScheduler
+from routing import DroppedUpdates, allowed_updates_for
+from scenarios import SCENARIOS, SCENARIO_PERMUTATIONS, random_video_order
+from state_cache import MISSING, TTLCache
+from summary_stats import create_summary_tables, format_summary, load_summary
+from video_check import VideoCheckError, check_video_files
+
 nest_asyncio.apply()
 
 # ---------------------------------------------------------------------------
@@ -33,37 +48,118 @@ nest_asyncio.apply()
 BASE_DIR = Path(__file__).resolve().parent.parent
 TOKEN_PATH = BASE_DIR / "token" / "config.txt"
 DB_PATH = BASE_DIR / "data" / "ratings.db"
-LOG_DIR = BASE_DIR / "logs"
+# BOT_LOG_DIR — другой каталог для лога (бенчмарки пишут во временный, а не в logs/)
+LOG_DIR = Path(os.environ.get("BOT_LOG_DIR") or BASE_DIR / "logs")
 
 for p in (TOKEN_PATH.parent, DB_PATH.parent, LOG_DIR):
     p.mkdir(parents=True, exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_DIR / "bot.log", encoding="utf-8"),
-        logging.StreamHandler(),
-    ],
+# Запись в файл и консоль идёт из фонового потока (см. logging_setup.py).
+# Ротация logs/bot.log по размеру: BOT_LOG_MAX_BYTES (0 — без ротации) и число
+# архивных файлов BOT_LOG_BACKUPS; BOT_LOG_FORMAT — 'text' или 'json' (JSON Lines).
+LOG_MAX_BYTES = int(os.environ.get("BOT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("BOT_LOG_BACKUPS", "5"))
+LOG_FORMAT = os.environ.get("BOT_LOG_FORMAT", "text")
+if LOG_FORMAT not in ("text", "json"):
+    raise ValueError(f"Неизвестный формат лога: {LOG_FORMAT}")
+
+setup_logging(
+    LOG_DIR / "bot.log",
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUPS,
+    json_lines=(LOG_FORMAT == "json"),
 )
 logger = logging.getLogger("experiment_bot")
 
-try:
-    with open(TOKEN_PATH, "r", encoding="utf-8") as f:
-        BOT_TOKEN = f.read().strip()
-except FileNotFoundError:
-    logger.critical(f"❌ Файл с токеном не найден: {TOKEN_PATH}")
-    raise
-except Exception as e:
-    logger.critical(f"❌ Ошибка чтения токена: {e}")
-    raise
+
+def read_bot_token(path: Path = TOKEN_PATH) -> str:
+    # Токен читается при запуске бота, а не при импорте модуля: нагрузочные тесты
+    # в bench/ импортируют tg_bot без настоящего токена.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        logger.critical(f"❌ Файл с токеном не найден: {path}")
+        raise
+    except Exception as e:
+        logger.critical(f"❌ Ошибка чтения токена: {e}")
+        raise
+
+# ---------------------------------------------------------------------------
+#                         НАСТРОЙКИ ПРОИЗВОДИТЕЛЬНОСТИ
+# ---------------------------------------------------------------------------
+
+# Количество соединений на чтение в пуле БД (писатель всегда один)
+DB_POOL_READERS = int(os.environ.get("BOT_DB_POOL_READERS", "4"))
+
+# Запись ответов: 'sync' — сразу, 'group' — групповой коммит (ответ ждёт фиксации),
+# 'lazy' — в фоне без ожидания (при падении теряются ответы за ANSWER_FLUSH_MS)
+ANSWER_WRITE_MODE = os.environ.get("BOT_ANSWER_WRITE_MODE", "sync")
+ANSWER_FLUSH_MAX = int(os.environ.get("BOT_ANSWER_FLUSH_MAX", "64"))
+ANSWER_FLUSH_MS = int(os.environ.get("BOT_ANSWER_FLUSH_MS", "20"))
+
+# Кэш состояния участников: число записей в каждом кэше и время жизни, сек (0 — выключен)
+STATE_CACHE_SIZE = int(os.environ.get("BOT_STATE_CACHE_SIZE", "10000"))
+STATE_CACHE_TTL = float(os.environ.get("BOT_STATE_CACHE_TTL", "300"))
+
+# Хранение порядка видео: 'rows' — 4 строки video_sequence на участника,
+# 'permutation' — номер перестановки сценариев в participants.video_order
+VIDEO_SEQUENCE_MODE = os.environ.get("BOT_VIDEO_SEQUENCE_MODE", "rows")
+
+# Сохранение context.user_data (шаг участника) между перезапусками: 'sqlite' или 'none';
+# интервал, сек, с которым изменения пакетно пишутся в БД
+PERSISTENCE_MODE = os.environ.get("BOT_PERSISTENCE", "sqlite")
+PERSISTENCE_INTERVAL = float(os.environ.get("BOT_PERSISTENCE_INTERVAL", "5"))
+
+# Сколько апдейтов обрабатывать одновременно (1 — строго последовательно).
+# Апдейты одного пользователя всё равно обрабатываются по очереди.
+CONCURRENT_UPDATES = int(os.environ.get("BOT_CONCURRENT_UPDATES", "32"))
+
+# Ограничение исходящих запросов к Bot API (см. rate_limiter.py): 'on' или 'off'.
+# Лимиты — сообщений в секунду на бота и в один чат, всплеск — сколько можно
+# отправить подряд без ожидания; сколько раз повторять запрос после RetryAfter.
+RATE_LIMIT = os.environ.get("BOT_RATE_LIMIT", "on")
+RATE_GLOBAL_PER_SEC = float(os.environ.get("BOT_RATE_GLOBAL_PER_SEC", "30"))
+RATE_GLOBAL_BURST = int(os.environ.get("BOT_RATE_GLOBAL_BURST", "30"))
+RATE_CHAT_PER_SEC = float(os.environ.get("BOT_RATE_CHAT_PER_SEC", "1"))
+RATE_CHAT_BURST = int(os.environ.get("BOT_RATE_CHAT_BURST", "5"))
+RATE_MAX_RETRIES = int(os.environ.get("BOT_RATE_MAX_RETRIES", "3"))
+
+# Как часто писать в лог статистику нагрузки, сек (0 — только при остановке)
+STATS_LOG_INTERVAL = float(os.environ.get("BOT_STATS_LOG_INTERVAL", "300"))
+
+# Получение апдейтов: 'polling' (long polling) или 'webhook' (встроенный HTTP-сервер)
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_LISTEN = os.environ.get("BOT_WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("BOT_WEBHOOK_PORT", "8443"))
+# Путь, на который Telegram присылает апдейты; лучше сделать его трудно угадываемым
+WEBHOOK_PATH = os.environ.get("BOT_WEBHOOK_PATH", "telegram")
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (пусто — не проверять)
+WEBHOOK_SECRET = os.environ.get("BOT_WEBHOOK_SECRET", "")
+# Внешний https-адрес вебхука, например https://bot.example.org/telegram; обязателен
+# в режиме webhook — при запуске бот регистрирует его в Telegram (setWebhook)
+WEBHOOK_URL = os.environ.get("BOT_WEBHOOK_URL", "")
+
+# Локальный HTTP-эндпоинт /metrics в формате Prometheus (порт 0 — выключен)
+METRICS_LISTEN = os.environ.get("BOT_METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("BOT_METRICS_PORT", "0"))
+
+# Telegram user_id исследователей через запятую: им доступна команда /stats
+ADMIN_IDS = [int(x) for x in os.environ.get("BOT_ADMIN_IDS", "").replace(" ", "").split(",") if x]
+
+# Проверка file_id видео при запуске (см. video_check.py): 'on' или 'off'.
+# Замены недействительных видео берутся из <BOT_VIDEO_FALLBACK_DIR>/<условие>/<сценарий>.mp4
+# и загружаются в чат BOT_VIDEO_UPLOAD_CHAT_ID (по умолчанию — первый из BOT_ADMIN_IDS).
+VIDEO_CHECK = os.environ.get("BOT_VIDEO_CHECK", "on")
+VIDEO_FALLBACK_DIR = Path(os.environ.get("BOT_VIDEO_FALLBACK_DIR", BASE_DIR / "data" / "videos"))
+VIDEO_UPLOAD_CHAT_ID = int(os.environ.get("BOT_VIDEO_UPLOAD_CHAT_ID") or (ADMIN_IDS[0] if ADMIN_IDS else 0)) or None
+VIDEO_CHECK_CACHE_PATH = BASE_DIR / "data" / "video_files.json"
 
 # ---------------------------------------------------------------------------
 #                           КОНСТАНТЫ ЭКСПЕРИМЕНТА
 # ---------------------------------------------------------------------------
 
-# Сценарии
-SCENARIOS = ["Пицца", "Наперстки", "Детали", "Шахматы"]
+# Сценарии (SCENARIOS) и порядки их показа описаны в scenarios.py
 
 # Два типа условий: «без» и «с»
 VIDEO_CONDITIONS = ["без", "с"]
@@ -84,36 +180,33 @@ VIDEO_FILES = {
     },
 }
 
-# Формулировки пар утверждений для шкалы 1–10
-SCENARIO_QUESTIONS = {
-    "Пицца": (
-        "Ф-2 выбирает подходящие ингредиенты для пиццы",
-        "Ф-2 получает команду от компьютера указать на ингредиенты слева",
-    ),
-    "Наперстки": (
-        "Ф-2 пытается обыграть испытуемую в напёрстки",
-        "Ф-2 получает команду от компьютера указать на средний стаканчик",
-    ),
-    "Детали": (
-        "Ф-2 оценивает, какая деталь подходит для хвоста",
-        "Ф-2 получает команду от компьютера указать на деталь с определённым QR-кодом",
-    ),
-    "Шахматы": (
-        "Ф-2 обдумывает свой следующий ход",
-        "Ф-2 получает команду от компьютера указать на свободную клетку",
-    ),
-}
 
-# Ссылка на Google-форму
-GOOGLE_FORM_URL = "https://example.com/google-form"  # ЗАМЕНИТЕ НА РЕАЛЬНУЮ ССЫЛКУ
+def build_video_order_table() -> Dict[str, List[List[Dict[str, Any]]]]:
+    """
+    Предрасчитанные последовательности видео для режима 'permutation':
+    условие -> номер перестановки SCENARIOS -> список видео по позициям.
+    """
+    return {
+        condition: [
+            [
+                {"condition": condition, "scenario": scenario, "file_id": files.get(scenario)}
+                for scenario in order
+            ]
+            for order in SCENARIO_PERMUTATIONS
+        ]
+        for condition, files in VIDEO_FILES.items()
+    }
+
+
+VIDEO_ORDER_TABLE = build_video_order_table()
 
 
 # ---------------------------------------------------------------------------
 #                            СОЗДАНИЕ БД
 # ---------------------------------------------------------------------------
 
-async def create_schema_and_fill():
-    async with aiosqlite.connect(DB_PATH) as db:
+async def create_schema_and_fill(db_path: Path = DB_PATH):
+    async with aiosqlite.connect(db_path) as db:
         await db.execute("PRAGMA foreign_keys = ON;")
         await db.execute("PRAGMA journal_mode = WAL;")
 
@@ -142,7 +235,9 @@ async def create_schema_and_fill():
                 current_video_idx INTEGER NOT NULL DEFAULT 0,
                 total_videos      INTEGER NOT NULL DEFAULT 4,
                 completed         INTEGER NOT NULL DEFAULT 0, -- 0/1
+                video_order       INTEGER,   -- номер перестановки SCENARIOS (режим 'permutation')
                 created_at        TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at        INTEGER,   -- мс Unix-времени последнего изменения
                 FOREIGN KEY(user_id) REFERENCES users(user_id)
             );
             """
@@ -175,22 +270,152 @@ async def create_schema_and_fill():
                 adv_behavior    TEXT,      -- "Робот ведёт себя ____"
                 adv_choice      TEXT,      -- "Робот делает выбор ____"
                 scenario_rating INTEGER,   -- 1..10
+                updated_at      INTEGER,   -- мс Unix-времени последнего изменения
                 PRIMARY KEY (user_id, position),
                 FOREIGN KEY(user_id) REFERENCES users(user_id)
             );
             """
         )
 
+        # Состояние диалога (context.user_data) для SQLitePersistence
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bot_user_data (
+                user_id INTEGER PRIMARY KEY,
+                data    TEXT NOT NULL   -- JSON
+            );
+            """
+        )
+
+        # Миграции для баз, созданных предыдущими версиями бота
+        await _ensure_column(db, "participants", "video_order", "INTEGER")
+        await _ensure_column(db, "participants", "updated_at", "INTEGER")
+        await _ensure_column(db, "answers", "updated_at", "INTEGER")
+
+        # Поиск изменённых строк для read_db.py --incremental. В индексе answers есть
+        # и user_id, чтобы подсчёт изменившихся участников не читал саму таблицу
+        # (у participants user_id — это rowid, он и так есть в индексе).
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_participants_updated_at ON participants(updated_at)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_answers_updated_user ON answers(updated_at, user_id)"
+        )
+
+        # Покрывающий индекс порядка видео: get_video_sequence, снимок сессии и
+        # экспорт читают строки участника только из индекса, без обращения к таблице.
+        # Проверка планов запросов: bench/query_plans.py
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_video_sequence_covering
+            ON video_sequence(user_id, position, scenario, condition, file_id)
+            """
+        )
+        # Подстановка замены видео при старте (warm_up_videos) переписывает строки
+        # одного видео, не просматривая порядок видео всех участников
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_video_sequence_video ON video_sequence(condition, scenario, file_id)"
+        )
+
+        # Счётчики для /stats (участники по условиям, гистограммы оценок);
+        # обновляются триггерами в тех же транзакциях, что и записи бота
+        await create_summary_tables(db)
+
         await db.commit()
 
 
+async def _ensure_column(db: aiosqlite.Connection, table: str, column: str, decl: str):
+    cur = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cur.fetchall()}
+    await cur.close()
+    if column not in columns:
+        logger.info("Добавляю колонку %s.%s", table, column)
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
 # ---------------------------------------------------------------------------
 #                        УТИЛИТЫ РАБОТЫ С БАЗОЙ ДАННЫХ
 # ---------------------------------------------------------------------------
 
+# Время, SQL-запросы и вызовы Bot API по обработчикам и хелперам БД (см. metrics.py)
+metrics = Metrics()
+
+# Общий пул соединений; создаётся в main() через init_db_pool()
+db_pool: Optional[DBPool] = None
+
+
+async def init_db_pool(db_path: Path = DB_PATH, readers: int = DB_POOL_READERS) -> DBPool:
+    global db_pool
+    db_pool = DBPool(db_path, readers=readers, on_release=metrics.db_used)
+    await db_pool.open()
+    return db_pool
+
 
+async def close_db_pool():
+    global db_pool
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+
+
+def _pool() -> DBPool:
+    if db_pool is None:
+        raise RuntimeError("Пул соединений с БД не инициализирован (см. init_db_pool)")
+    return db_pool
+
+
+# Буфер отложенной записи ответов; None в режиме 'sync'
+answer_buffer: Optional[AnswerWriteBuffer] = None
+
+
+def init_answer_buffer(mode: str = ANSWER_WRITE_MODE) -> Optional[AnswerWriteBuffer]:
+    global answer_buffer
+    if mode == "sync":
+        answer_buffer = None
+    elif mode in ("group", "lazy"):
+        answer_buffer = AnswerWriteBuffer(
+            _pool(),
+            durable=(mode == "group"),
+            max_batch=ANSWER_FLUSH_MAX,
+            max_delay_ms=ANSWER_FLUSH_MS,
+        )
+        answer_buffer.start()
+    else:
+        raise ValueError(f"Неизвестный режим записи ответов: {mode}")
+    return answer_buffer
+
+
+async def close_answer_buffer():
+    global answer_buffer
+    if answer_buffer is not None:
+        await answer_buffer.close()
+        answer_buffer = None
+
+
+# Кэши состояния: участник по user_id, порядок видео по user_id, ответ по (user_id, position).
+# Значение None означает «строки в БД нет» и тоже кэшируется.
+participant_cache = TTLCache(STATE_CACHE_SIZE, STATE_CACHE_TTL)
+video_sequence_cache = TTLCache(STATE_CACHE_SIZE, STATE_CACHE_TTL)
+answer_cache = TTLCache(STATE_CACHE_SIZE, STATE_CACHE_TTL)
+
+
+def state_cache_stats() -> Dict[str, Any]:
+    return {
+        "participants": participant_cache.stats(),
+        "video_sequence": video_sequence_cache.stats(),
+        "answers": answer_cache.stats(),
+    }
+
+
+def clear_state_cache():
+    participant_cache.clear()
+    video_sequence_cache.clear()
+    answer_cache.clear()
+
+
+@metrics.instrument("db")
 async def ensure_user(user_id: int, username: str, first_name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _pool().writer() as db:
         await db.execute(
             """
             INSERT INTO users(user_id, tg_username, first_name)
@@ -204,23 +429,32 @@ async def ensure_user(user_id: int, username: str, first_name: str):
         await db.commit()
 
 
+@metrics.instrument("db")
 async def get_participant(user_id: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    cached = participant_cache.get(user_id)
+    if cached is not MISSING:
+        return dict(cached) if cached is not None else None
+
+    async with _pool().reader() as db:
         cur = await db.execute(
             """
             SELECT user_id, tg_username, first_name, participant_name,
-                   gender, age, condition, current_video_idx, total_videos, completed
+                   gender, age, condition, current_video_idx, total_videos, completed,
+                   video_order
             FROM participants
             WHERE user_id = ?
             """,
             (user_id,),
         )
         row = await cur.fetchone()
+        # Соединение долгоживущее: закрываем курсор, чтобы не держать снимок чтения
+        await cur.close()
 
     if not row:
+        participant_cache.set(user_id, None)
         return None
 
-    return {
+    participant = {
         "user_id": row[0],
         "tg_username": row[1],
         "first_name": row[2],
@@ -231,9 +465,67 @@ async def get_participant(user_id: int) -> Optional[Dict[str, Any]]:
         "current_video_idx": row[7],
         "total_videos": row[8],
         "completed": row[9],
+        "video_order": row[10],
     }
+    participant_cache.set(user_id, participant)
+    return dict(participant)
+
+
+def _patch_cached_participant(user_id: int, changes: Dict[str, Any]):
+    """Write-through: обновляет закэшированного участника или сбрасывает запись."""
+    cached = participant_cache.peek(user_id)
+    if cached is MISSING or cached is None:
+        # Новая строка получила DEFAULT-значения из схемы — проще перечитать её из БД
+        participant_cache.invalidate(user_id)
+        return
+    patched = dict(cached)
+    patched.update(changes)
+    participant_cache.set(user_id, patched)
+
+
+# Необязательные поля участника, которые create_participant пишет только если они переданы
+PARTICIPANT_OPTIONAL_FIELDS = ("participant_name", "gender", "age", "condition", "total_videos")
 
 
+@lru_cache(maxsize=None)
+def _participant_upsert_sql(fields: Tuple[str, ...]) -> str:
+    """
+    Один INSERT ... ON CONFLICT DO UPDATE для заданного набора необязательных полей.
+    Непереданные поля не попадают ни в INSERT, ни в SET — уже записанные данные
+    не затираются, а для новых строк срабатывают DEFAULT из схемы.
+    """
+    columns = ("user_id", "tg_username", "first_name") + fields
+    updates = ",\n                ".join(
+        [f"{col} = excluded.{col}" for col in columns[1:]] + ["updated_at = excluded.updated_at"]
+    )
+    return f"""
+            INSERT INTO participants ({", ".join(columns)}, updated_at)
+            VALUES ({", ".join("?" for _ in columns)}, {NOW_MS_SQL})
+            ON CONFLICT(user_id) DO UPDATE SET
+                {updates}
+            """
+
+
+def _participant_upsert_params(
+    user_id: int,
+    tg_username: Optional[str],
+    first_name: Optional[str],
+    **optional: Any,
+) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+    unknown = set(optional) - set(PARTICIPANT_OPTIONAL_FIELDS)
+    if unknown:
+        raise ValueError(f"Недопустимые поля participants: {sorted(unknown)}")
+
+    fields = tuple(
+        f for f in PARTICIPANT_OPTIONAL_FIELDS if optional.get(f) is not None
+    )
+    params = (user_id, tg_username or "", first_name or "") + tuple(
+        optional[f] for f in fields
+    )
+    return fields, params
+
+
+@metrics.instrument("db")
 async def create_participant(
     user_id: int,
     tg_username: Optional[str],
@@ -247,51 +539,66 @@ async def create_participant(
     """
     Создаёт участника, если его ещё нет, и аккуратно обновляет только те поля,
     которые явно переданы (не None). Так мы не затираем уже записанные данные.
+    Всё делается одним запросом в одной транзакции.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO participants (user_id, tg_username, first_name)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                tg_username = excluded.tg_username,
-                first_name  = excluded.first_name
-            """,
-            (user_id, tg_username or "", first_name or ""),
-        )
-
-        if participant_name is not None:
-            await db.execute(
-                "UPDATE participants SET participant_name = ? WHERE user_id = ?",
-                (participant_name, user_id),
-            )
+    fields, params = _participant_upsert_params(
+        user_id,
+        tg_username,
+        first_name,
+        participant_name=participant_name,
+        gender=gender,
+        age=age,
+        condition=condition,
+        total_videos=total_videos,
+    )
+    async with _pool().writer() as db:
+        await db.execute(_participant_upsert_sql(fields), params)
+        await db.commit()
 
-        if gender is not None:
-            await db.execute(
-                "UPDATE participants SET gender = ? WHERE user_id = ?",
-                (gender, user_id),
-            )
+    _patch_cached_participant(
+        user_id, dict(zip(("user_id", "tg_username", "first_name") + fields, params))
+    )
 
-        if age is not None:
-            await db.execute(
-                "UPDATE participants SET age = ? WHERE user_id = ?",
-                (age, user_id),
-            )
 
-        if condition is not None:
-            await db.execute(
-                "UPDATE participants SET condition = ? WHERE user_id = ?",
-                (condition, user_id),
-            )
+@metrics.instrument("db")
+async def create_participants_batch(participants: Iterable[Dict[str, Any]]) -> int:
+    """
+    Пакетный вариант create_participant: принимает словари с теми же ключами
+    (user_id, tg_username, first_name и необязательные поля) и записывает их
+    в одной транзакции. Строки с одинаковым набором полей идут одним executemany.
+    Возвращает число обработанных участников.
+    """
+    groups: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+    count = 0
+    for item in participants:
+        item = dict(item)
+        fields, params = _participant_upsert_params(
+            item.pop("user_id"),
+            item.pop("tg_username", None),
+            item.pop("first_name", None),
+            **item,
+        )
+        groups.setdefault(fields, []).append(params)
+        count += 1
 
-        if total_videos is not None:
-            await db.execute(
-                "UPDATE participants SET total_videos = ? WHERE user_id = ?",
-                (total_videos, user_id),
-            )
+    if not groups:
+        return 0
 
+    async with _pool().writer() as db:
+        for fields, rows in groups.items():
+            await db.executemany(_participant_upsert_sql(fields), rows)
         await db.commit()
 
+    # Кэш обновляем только после коммита, иначе параллельное чтение вернёт в него старую строку
+    for fields, rows in groups.items():
+        columns = ("user_id", "tg_username", "first_name") + fields
+        for params in rows:
+            _patch_cached_participant(params[0], dict(zip(columns, params)))
+
+    return count
+
+
+@metrics.instrument("db")
 async def update_participant_progress(
     user_id: int,
     current_video_idx: Optional[int] = None,
@@ -302,25 +609,32 @@ async def update_participant_progress(
 
     fields = []
     params = []
+    changes: Dict[str, Any] = {}
 
     if current_video_idx is not None:
         fields.append("current_video_idx = ?")
         params.append(current_video_idx)
+        changes["current_video_idx"] = current_video_idx
 
     if completed is not None:
         fields.append("completed = ?")
         params.append(1 if completed else 0)
+        changes["completed"] = 1 if completed else 0
 
+    fields.append(f"updated_at = {NOW_MS_SQL}")
     params.append(user_id)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _pool().writer() as db:
         await db.execute(
             f"UPDATE participants SET {', '.join(fields)} WHERE user_id = ?",
             params,
         )
         await db.commit()
 
+    _patch_cached_participant(user_id, changes)
+
 
+@metrics.instrument("db")
 async def create_video_sequence_for_participant(user_id: int, condition: str):
     """
     Формирует порядок из 4 видео (по одному на каждый сценарий) в случайном порядке.
@@ -338,46 +652,122 @@ async def create_video_sequence_for_participant(user_id: int, condition: str):
             )
         videos.append((scenario, file_id))
 
+    if VIDEO_SEQUENCE_MODE == "permutation":
+        # Одно число в participants вместо четырёх строк video_sequence
+        video_order = random_video_order()
+        async with _pool().writer() as db:
+            await db.execute(
+                f"UPDATE participants SET video_order = ?, updated_at = {NOW_MS_SQL} WHERE user_id = ?",
+                (video_order, user_id),
+            )
+            await db.commit()
+
+        _patch_cached_participant(user_id, {"video_order": video_order})
+        video_sequence_cache.set(user_id, VIDEO_ORDER_TABLE[condition][video_order])
+        return
+
     random.shuffle(videos)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _pool().writer() as db:
         await db.execute(
             "DELETE FROM video_sequence WHERE user_id = ?",
             (user_id,),
         )
 
-        for pos, (scenario, file_id) in enumerate(videos):
-            await db.execute(
-                """
-                INSERT INTO video_sequence(user_id, position, condition, scenario, file_id)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user_id, pos, condition, scenario, file_id),
-            )
+        await db.executemany(
+            """
+            INSERT INTO video_sequence(user_id, position, condition, scenario, file_id)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (user_id, pos, condition, scenario, file_id)
+                for pos, (scenario, file_id) in enumerate(videos)
+            ],
+        )
+
+        # video_order имеет приоритет над строками video_sequence — сбрасываем его.
+        # updated_at отмечает, что порядок видео (а значит, строки экспорта) изменился.
+        await db.execute(
+            f"UPDATE participants SET video_order = NULL, updated_at = {NOW_MS_SQL} WHERE user_id = ?",
+            (user_id,),
+        )
 
         await db.commit()
 
+    _patch_cached_participant(user_id, {"video_order": None})
 
-async def get_video_by_position(user_id: int, position: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    video_sequence_cache.set(
+        user_id,
+        [
+            {"condition": condition, "scenario": scenario, "file_id": file_id}
+            for scenario, file_id in videos
+        ],
+    )
+
+
+def _sequence_from_video_order(participant: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Порядок видео из VIDEO_ORDER_TABLE, если участнику назначен номер перестановки."""
+    video_order = participant.get("video_order")
+    condition = participant.get("condition")
+    if video_order is None or condition not in VIDEO_ORDER_TABLE:
+        return None
+    return VIDEO_ORDER_TABLE[condition][video_order]
+
+
+@metrics.instrument("db")
+async def get_video_sequence(user_id: int) -> List[Dict[str, Any]]:
+    """Весь порядок видео участника (список по позициям); читается и кэшируется целиком."""
+    cached = video_sequence_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+
+    participant = await get_participant(user_id)
+    sequence = _sequence_from_video_order(participant) if participant else None
+    if sequence is not None:
+        video_sequence_cache.set(user_id, sequence)
+        return sequence
+
+    async with _pool().reader() as db:
         cur = await db.execute(
             """
-            SELECT condition, scenario, file_id
+            SELECT position, condition, scenario, file_id
             FROM video_sequence
-            WHERE user_id = ? AND position = ?
+            WHERE user_id = ?
+            ORDER BY position
             """,
-            (user_id, position),
+            (user_id,),
         )
-        row = await cur.fetchone()
+        rows = await cur.fetchall()
+        await cur.close()
 
-    if not row:
-        return None
+    # Позиции идут подряд с нуля; на случай пропусков раскладываем по индексу
+    sequence: List[Optional[Dict[str, Any]]] = [None] * (rows[-1][0] + 1 if rows else 0)
+    for position, condition, scenario, file_id in rows:
+        sequence[position] = {"condition": condition, "scenario": scenario, "file_id": file_id}
+
+    video_sequence_cache.set(user_id, sequence)
+    return sequence
 
-    return {"condition": row[0], "scenario": row[1], "file_id": row[2]}
+
+@metrics.instrument("db")
+async def get_video_by_position(user_id: int, position: int) -> Optional[Dict[str, Any]]:
+    sequence = await get_video_sequence(user_id)
+    if position < 0 or position >= len(sequence) or sequence[position] is None:
+        return None
+    return dict(sequence[position])
 
 
+@metrics.instrument("db")
 async def get_answer(user_id: int, position: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(DB_PATH) as db:
+    cached = answer_cache.get((user_id, position))
+    if cached is not MISSING:
+        return dict(cached) if cached is not None else None
+
+    # Несброшенные поля берутся до чтения БД: если сброс буфера завершится между
+    # двумя шагами, поле окажется хотя бы в одном из источников
+    pending = answer_buffer.pending_fields(user_id, position) if answer_buffer else {}
+
+    async with _pool().reader() as db:
         cur = await db.execute(
             """
             SELECT scenario, file_id, description, adv_behavior, adv_choice, scenario_rating
@@ -387,20 +777,47 @@ async def get_answer(user_id: int, position: int) -> Optional[Dict[str, Any]]:
             (user_id, position),
         )
         row = await cur.fetchone()
+        await cur.close()
 
-    if not row:
+    if not row and not pending:
+        answer_cache.set((user_id, position), None)
         return None
 
-    return {
-        "scenario": row[0],
-        "file_id": row[1],
-        "description": row[2],
-        "adv_behavior": row[3],
-        "adv_choice": row[4],
-        "scenario_rating": row[5],
+    answer = {
+        "scenario": row[0] if row else None,
+        "file_id": row[1] if row else None,
+        "description": row[2] if row else None,
+        "adv_behavior": row[3] if row else None,
+        "adv_choice": row[4] if row else None,
+        "scenario_rating": row[5] if row else None,
     }
+    # Поля, ещё не сброшенные буфером отложенной записи, новее данных из БД
+    answer.update(pending)
+    answer_cache.set((user_id, position), answer)
+    return dict(answer)
 
 
+def _patch_cached_answer(
+    user_id: int,
+    position: int,
+    scenario: str,
+    file_id: str,
+    field_name: str,
+    value: Any,
+):
+    key = (user_id, position)
+    cached = answer_cache.peek(key)
+    if cached is MISSING:
+        return
+    if cached is None:
+        # Строки не было — теперь известна целиком
+        cached = {f: None for f in ANSWER_FIELDS}
+    patched = dict(cached)
+    patched.update({"scenario": scenario, "file_id": file_id, field_name: value})
+    answer_cache.set(key, patched)
+
+
+@metrics.instrument("db")
 async def upsert_answer_field(
     user_id: int,
     position: int,
@@ -409,134 +826,261 @@ async def upsert_answer_field(
     field_name: str,
     value: Any,
 ):
-    if field_name not in ("description", "adv_behavior", "adv_choice", "scenario_rating"):
+    if field_name not in ANSWER_FIELDS:
         raise ValueError(f"Недопустимое поле answers: {field_name}")
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO answers(user_id, position, scenario, file_id)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id, position) DO UPDATE SET
-                scenario = excluded.scenario,
-                file_id  = excluded.file_id
-            """,
-            (user_id, position, scenario, file_id),
-        )
+    if answer_buffer is not None:
+        await answer_buffer.submit(user_id, position, scenario, file_id, field_name, value)
+    else:
+        async with _pool().writer() as db:
+            await db.execute(
+                answer_upsert_sql((field_name,)),
+                (user_id, position, scenario, file_id, value),
+            )
+            await db.commit()
 
-        await db.execute(
-            f"UPDATE answers SET {field_name} = ? WHERE user_id = ? AND position = ?",
-            (value, user_id, position),
-        )
+    _patch_cached_answer(user_id, position, scenario, file_id, field_name, value)
 
-        await db.commit()
+
+@metrics.instrument("db")
+async def load_dashboard_stats() -> Dict[str, Any]:
+    """Сводка для /stats из таблиц stats_* (см. summary_stats.py), без просмотра answers."""
+    async with _pool().reader() as db:
+        return await load_summary(db)
 
 
 # ---------------------------------------------------------------------------
 #                        ЛОГИКА ПРОГРЕССА ПО ЭКСПЕРИМЕНТУ
 # ---------------------------------------------------------------------------
 
-async def determine_next_stage(user_id: int) -> str:
+PARTICIPANT_COLUMNS = (
+    "user_id", "tg_username", "first_name", "participant_name", "gender",
+    "age", "condition", "current_video_idx", "total_videos", "completed",
+    "video_order",
+)
+
+
+@dataclass(frozen=True)
+class SessionSnapshot:
     """
-    Возвращает, какой следующий шаг нужен пользователю:
-    - 'finished'                — все видео пройдены
-    - 'expect_description'      — нужно описание действий робота
-    - 'expect_adv_behavior'     — нужно наречие поведения
-    - 'expect_adv_choice'       — нужно наречие выбора
-    - 'expect_rating'           — нужна оценка 1–10
+    Неизменяемый снимок сессии участника: поля participants, текущее видео
+    (позиция current_video_idx) и ответ по нему. Собирается одним запросом
+    в load_session_snapshot() и дальше передаётся по стейт-машине без перечитывания.
     """
-    participant = await get_participant(user_id)
-    if not participant:
-        return "no_participant"
 
-    if participant["completed"]:
-        return "finished"
+    user_id: int
+    tg_username: Optional[str]
+    first_name: Optional[str]
+    participant_name: Optional[str]
+    gender: Optional[str]
+    age: Optional[int]
+    condition: Optional[str]
+    current_video_idx: int
+    total_videos: int
+    completed: int
+    video_order: Optional[int]
+
+    # текущее видео (None, если для позиции нет строки в video_sequence)
+    scenario: Optional[str] = None
+    file_id: Optional[str] = None
+
+    # ответ по текущему видео
+    description: Optional[str] = None
+    adv_behavior: Optional[str] = None
+    adv_choice: Optional[str] = None
+    scenario_rating: Optional[int] = None
+
+    @property
+    def participant(self) -> Dict[str, Any]:
+        return {col: getattr(self, col) for col in PARTICIPANT_COLUMNS}
+
+    @property
+    def has_video(self) -> bool:
+        return self.file_id is not None
+
+    @property
+    def stage(self) -> str:
+        """
+        Какой следующий шаг нужен пользователю:
+        - 'finished'                — все видео пройдены
+        - 'expect_description'      — нужно описание действий робота
+        - 'expect_adv_behavior'     — нужно наречие поведения
+        - 'expect_adv_choice'       — нужно наречие выбора
+        - 'expect_rating'           — нужна оценка 1–10
+        """
+        if self.completed:
+            return "finished"
+        if self.current_video_idx >= self.total_videos:
+            return "finished"
+
+        if self.description is None:
+            return "expect_description"
+        if self.adv_behavior is None:
+            return "expect_adv_behavior"
+        if self.adv_choice is None:
+            return "expect_adv_choice"
+        if self.scenario_rating is None:
+            return "expect_rating"
 
+        return "expect_description"
 
-    idx = participant["current_video_idx"]
-    total = participant["total_videos"]
 
-    if idx >= total:
-        return "finished"
+def _build_snapshot(
+    participant: Dict[str, Any],
+    video: Optional[Dict[str, Any]],
+    answer: Optional[Dict[str, Any]],
+) -> SessionSnapshot:
+    video = video or {}
+    answer = answer or {}
+    return SessionSnapshot(
+        **{col: participant[col] for col in PARTICIPANT_COLUMNS},
+        scenario=video.get("scenario"),
+        file_id=video.get("file_id"),
+        **{field: answer.get(field) for field in ANSWER_FIELDS},
+    )
 
-    ans = await get_answer(user_id, idx)
-    if not ans or ans["description"] is None:
-        return "expect_description"
-    if ans["adv_behavior"] is None:
-        return "expect_adv_behavior"
-    if ans["adv_choice"] is None:
-        return "expect_adv_choice"
-    if ans["scenario_rating"] is None:
-        return "expect_rating"
 
-    return "expect_description"
+@metrics.instrument("db")
+async def load_session_snapshot(user_id: int) -> Optional[SessionSnapshot]:
+    """
+    Участник, его порядок видео и ответ по текущему видео одним JOIN-запросом
+    (или целиком из кэша состояния). None — участника нет.
+    """
+    participant = participant_cache.get(user_id)
+    if participant is None:
+        return None
 
+    if participant is not MISSING:
+        idx = participant["current_video_idx"]
+        sequence = video_sequence_cache.get(user_id)
+        answer = answer_cache.get((user_id, idx))
+        if sequence is not MISSING and answer is not MISSING:
+            video = sequence[idx] if 0 <= idx < len(sequence) else None
+            return _build_snapshot(participant, video, answer)
 
-async def continue_experiment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    participant = await get_participant(user_id)
+    # Позиция участника ещё неизвестна, поэтому до запроса берутся несброшенные поля
+    # по всем его позициям (иначе сброс между запросом и чтением буфера потеряет поле)
+    pending_by_position = answer_buffer.pending_for_user(user_id) if answer_buffer else {}
 
-    if not participant:
-        await update.effective_chat.send_message(
-            "Не удалось найти вашу сессию. Нажмите /start, чтобы начать сначала."
+    async with _pool().reader() as db:
+        cur = await db.execute(
+            """
+            SELECT p.user_id, p.tg_username, p.first_name, p.participant_name,
+                   p.gender, p.age, p.condition, p.current_video_idx, p.total_videos, p.completed,
+                   p.video_order,
+                   v.position, v.condition, v.scenario, v.file_id,
+                   a.position IS NOT NULL,
+                   a.scenario, a.file_id, a.description, a.adv_behavior, a.adv_choice,
+                   a.scenario_rating
+            FROM participants p
+            LEFT JOIN video_sequence v
+                ON v.user_id = p.user_id
+            LEFT JOIN answers a
+                ON a.user_id = p.user_id
+               AND a.position = p.current_video_idx
+            WHERE p.user_id = ?
+            ORDER BY v.position
+            """,
+            (user_id,),
         )
+        rows = await cur.fetchall()
+        await cur.close()
+
+    if not rows:
+        participant_cache.set(user_id, None)
+        return None
+
+    first = rows[0]
+    participant = dict(zip(PARTICIPANT_COLUMNS, first[:11]))
+    idx = participant["current_video_idx"]
+
+    # Весь порядок видео приходит в тех же строках (или задан номером перестановки) —
+    # кэшируем его целиком
+    sequence = _sequence_from_video_order(participant)
+    if sequence is None:
+        positioned = [r for r in rows if r[11] is not None]
+        sequence = [None] * (positioned[-1][11] + 1 if positioned else 0)
+        for r in positioned:
+            sequence[r[11]] = {"condition": r[12], "scenario": r[13], "file_id": r[14]}
+
+    answer: Optional[Dict[str, Any]] = None
+    if first[15]:
+        answer = dict(zip(("scenario", "file_id") + ANSWER_FIELDS, first[16:22]))
+    pending = pending_by_position.get(idx)
+    if pending:
+        if answer is None:
+            answer = dict.fromkeys(("scenario", "file_id") + ANSWER_FIELDS)
+        answer.update(pending)
+
+    participant_cache.set(user_id, participant)
+    video_sequence_cache.set(user_id, sequence)
+    answer_cache.set((user_id, idx), answer)
+
+    video = sequence[idx] if 0 <= idx < len(sequence) else None
+    return _build_snapshot(participant, video, answer)
+
+
+async def determine_next_stage(user_id: int) -> str:
+    """Следующий шаг пользователя (см. SessionSnapshot.stage) или 'no_participant'."""
+    snapshot = await load_session_snapshot(user_id)
+    if snapshot is None:
+        return "no_participant"
+    return snapshot.stage
+
+
+@metrics.instrument("handler")
+async def continue_experiment(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    snapshot: Optional[SessionSnapshot] = None,
+):
+    """
+    Отправляет участнику следующий шаг. Если вызывающий код уже держит актуальный
+    снимок сессии (например, после своей записи), он передаёт его в snapshot.
+    """
+    if snapshot is None:
+        snapshot = await load_session_snapshot(update.effective_user.id)
+
+    if not snapshot:
+        await update.effective_chat.send_message(TEXTS["session_not_found"])
         context.user_data.clear()
         return
 
-    if participant["completed"]:
-        await send_final_message(update, participant)
+    if snapshot.completed:
+        await send_final_message(update, snapshot.participant)
         context.user_data.clear()
         return
 
-    idx = participant["current_video_idx"]
-    total = participant["total_videos"]
+    idx = snapshot.current_video_idx
+    total = snapshot.total_videos
 
-    video_info = await get_video_by_position(user_id, idx)
-    if not video_info:
-        await update.effective_chat.send_message(
-            "Ошибка: не найдена информация о текущем видео. "
-            "Пожалуйста, напишите организатору или попробуйте позже."
-        )
+    if not snapshot.has_video:
+        await update.effective_chat.send_message(TEXTS["video_missing"])
         return
 
-    stage = await determine_next_stage(user_id)
+    stage = snapshot.stage
     context.user_data["stage"] = stage
 
-    scenario = video_info["scenario"]
-    file_id = video_info["file_id"]
+    scenario = snapshot.scenario
+    file_id = snapshot.file_id
 
     if stage == "expect_description":
-        caption = (
-            f"🎥 Видео {idx + 1} из {total}.\n\n"
-            "1️⃣/4️⃣ Пожалуйста, посмотрите это видео со звуком."
-        )
         await context.bot.send_video(
             chat_id=update.effective_chat.id,
             video=file_id,
-            caption=caption,
-        )
-        await update.effective_chat.send_message(
-            "2️⃣/4️⃣ Опишите, что делает робот на этом видео."
+            caption=video_caption(idx + 1, total),
         )
     elif stage == "expect_adv_behavior":
-        await update.effective_chat.send_message(
-            "3️⃣/4️⃣ Вставьте наречие вместо пробела.\n"
-            "Робот ведёт себя ____ (Как?)"
-        )
+        await update.effective_chat.send_message(TEXTS["ask_adv_behavior"])
     elif stage == "expect_adv_choice":
-        await update.effective_chat.send_message(
-            "4️⃣/4️⃣ Вставьте наречие вместо пробела.\n"
-            "Робот делает выбор ____ (Как?)"
-        )
+        await update.effective_chat.send_message(TEXTS["ask_adv_choice"])
     elif stage == "expect_rating":
         await send_scenario_rating_question(update, context, scenario)
     elif stage == "finished":
-        await send_final_message(update, participant)
+        await send_final_message(update, snapshot.participant)
         context.user_data.clear()
     else:
-        await update.effective_chat.send_message(
-            "Произошла ошибка с восстановлением шага. Нажмите /start, чтобы начать заново."
-        )
+        await update.effective_chat.send_message(TEXTS["stage_restore_error"])
         context.user_data.clear()
 
 
@@ -545,45 +1089,16 @@ async def send_scenario_rating_question(
     context: ContextTypes.DEFAULT_TYPE,
     scenario: str,
 ):
-    left, right = SCENARIO_QUESTIONS[scenario]
-    text = (
-        f"🧩 *К какому утверждению вы больше склоняетесь?*\n\n"
-        f"1️⃣ {left}\n"
-        f"2️⃣ {right}\n\n"
-        "Пожалуйста, выберите число от 1 до 10, показывающее, "
-        "какое из двух утверждений, на ваш взгляд, лучше всего описывает происходящее на видео: "
-        "чем ближе число к 1 — тем больше подходит *первое утверждение*, "
-        "чем ближе к 10 — тем больше подходит *второе утверждение*."
-    )
-
-    keyboard = []
-    row = []
-    for i in range(1, 11):
-        row.append(InlineKeyboardButton(str(i), callback_data=f"likert_{i}"))
-        if len(row) == 5:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
     await update.effective_chat.send_message(
-        text,
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        RATING_QUESTIONS[scenario],
+        reply_markup=LIKERT_KEYBOARD,
         parse_mode="Markdown"
     )
 
 
 async def send_final_message(update: Update, participant: Dict[str, Any]):
     name = participant.get("participant_name") or "ваше имя/псевдоним"
-    text = (
-        "Спасибо! Все ваши ответы сохранены.\n\n"
-        "Теперь, пожалуйста, перейдите по ссылке для прохождения подробного опроса "
-        "о ваших психологических характеристиках, отношении к роботам, ценностях и т.д.\n\n"
-        f"👉 {GOOGLE_FORM_URL}\n\n"
-        f"Пожалуйста, укажите в Google-форме то же имя или псевдоним, "
-        f"который вы написали в начале диалога: «{name}»."
-    )
-    await update.effective_chat.send_message(text)
+    await update.effective_chat.send_message(final_message(name))
 
 
 # ---------------------------------------------------------------------------
@@ -601,67 +1116,36 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
     await ensure_user(user_id, user.username or "", user.first_name or "")
 
-    participant = await get_participant(user_id)
+    snapshot = await load_session_snapshot(user_id)
+    participant = snapshot.participant if snapshot else None
 
     if participant and participant["completed"]:
-        await update.message.reply_text(
-            "🎉 Спасибо за участие! Ваши ответы уже сохранены. "
-            "Если хотите проверить, можно ли заполнить Google-форму — ссылка ниже:"
-        )
+        await update.message.reply_text(TEXTS["already_completed"])
         await send_final_message(update, participant)
         return
 
     if participant and not participant["completed"]:
         if not participant["participant_name"]:
             context.user_data["stage"] = "ask_name"
-            await update.message.reply_text(
-                "1️⃣/3️⃣ — Как вас можно назвать в этом исследовании? "
-                "Напишите имя или псевдоним (запомните его — потом укажете в Google-форме)."
-            )
+            await update.message.reply_text(TEXTS["ask_name"])
             return
 
         if not participant["gender"]:
             context.user_data["stage"] = "ask_gender"
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("👩 Женский", callback_data="gender_female"),
-                InlineKeyboardButton("👨 Мужской", callback_data="gender_male")]
-            ])
-            await update.message.reply_text(
-                "2️⃣/3️⃣ — Укажите ваш пол:",
-                reply_markup=keyboard
-            )
+            await update.message.reply_text(TEXTS["ask_gender"], reply_markup=GENDER_KEYBOARD)
             return
 
         if participant["age"] is None:
             context.user_data["stage"] = "ask_age"
-            await update.message.reply_text(
-                "3️⃣/3️⃣ — Укажите, пожалуйста, ваш возраст (числом):"
-            )
+            await update.message.reply_text(TEXTS["ask_age"])
             return
 
-        await update.message.reply_text(
-            "Мы продолжаем ваш эксперимент с того места, где вы остановились."
-        )
-        await continue_experiment(update, context)
+        await update.message.reply_text(TEXTS["resume"])
+        await continue_experiment(update, context, snapshot)
         return
 
     if not participant:
-        instruction = (
-            "Спасибо, что согласились принять участие в исследовании "
-            "Лаборатории нейрокогнитивных технологий и робототехники (Курчатовский институт).\n\n"
-            "Вам нужно будет посмотреть 4 коротких видео и ответить на несколько вопросов по каждому из них — "
-            "это займёт примерно 5–10 минут.\n"
-            "В конце этого диалога появится ссылка на Google-форму, где нужно будет заполнить более подробный "
-            "опрос о ваших психологических характеристиках, отношении к роботам, ценностях и т.д. — "
-            "этот опрос займёт примерно 20–25 минут.\n\n"
-            "Пожалуйста, укажите одинаковое имя или псевдоним в обеих анкетах — это необходимо для последующего "
-            "объединения данных. Участие добровольное, все данные обрабатываются анонимно.\n\n"
-            "Рекомендации: для просмотра видео выберите тихое место либо используйте наушники.\n\n"
-            "📋 Сначала, ответьте, пожалуйста на *3 личных вопроса*.\n\n"
-            "1️⃣/3️⃣ — Как вас можно назвать в этом исследовании? "
-            "Напишите имя или псевдоним (запомните его — потом укажете в Google-форме)."
-        )
-        await update.message.reply_text(instruction, parse_mode="Markdown")
+        await update.message.reply_text(MARKDOWN_TEXTS["instruction"], parse_mode="Markdown")
 
         context.user_data.clear()
         context.user_data["stage"] = "ask_name"
@@ -678,9 +1162,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stage = context.user_data.get("stage")
 
     if not stage:
-        await message.reply_text(
-            "Пожалуйста, нажмите /start, чтобы начать или продолжить эксперимент."
-        )
+        await message.reply_text(TEXTS["press_start"])
         return
 
     # ---------- Блок общих вопросов ----------
@@ -696,31 +1178,13 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         context.user_data["stage"] = "ask_gender"
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("👩 Женский", callback_data="gender_female"),
-            InlineKeyboardButton("👨 Мужской", callback_data="gender_male")]
-        ])
-        await message.reply_text(
-            "2️⃣/3️⃣ — Укажите ваш пол:",
-            reply_markup=keyboard
-        )
+        await message.reply_text(TEXTS["ask_gender"], reply_markup=GENDER_KEYBOARD)
         return
-    
-    await create_participant(
-        user_id=user_id,
-        tg_username=update.effective_user.username or "",
-        first_name=update.effective_user.first_name or "",
-        participant_name=text,
-        gender=None,
-        age=None,
-        condition=None,
-        total_videos=None,
-    )
 
     if stage == "ask_gender":
         context.user_data["gender"] = text
         context.user_data["stage"] = "ask_age"
-        await message.reply_text("3️⃣/3️⃣ Укажите, пожалуйста, ваш возраст (числом).")
+        await message.reply_text(TEXTS["ask_age_after_text"])
         return
 
     if stage == "ask_age":
@@ -729,26 +1193,14 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if age <= 0 or age > 120:
                 raise ValueError
         except ValueError:
-            await message.reply_text(
-                "3️⃣/3️⃣ — Пожалуйста, укажите возраст целым числом (например, 25)."
-            )
+            await message.reply_text(TEXTS["age_invalid"])
             return
 
         user = update.effective_user
         participant_name = context.user_data.get("participant_name", "").strip()
         gender = context.user_data.get("gender", "").strip()
 
-        # 1) сохраняем возраст в БД
-        await create_participant(
-            user_id=user.id,
-            tg_username=user.username,
-            first_name=user.first_name,
-            participant_name=participant_name,
-            gender=gender,
-            age=age,
-        )
-
-        # 2) выбираем условие и сохраняем его отдельно
+        # выбираем условие и сохраняем его вместе с возрастом одним запросом
         condition = random.choice(VIDEO_CONDITIONS)
         total_videos = len(SCENARIOS)
 
@@ -756,23 +1208,16 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_id=user.id,
             tg_username=user.username,
             first_name=user.first_name,
+            participant_name=participant_name,
+            gender=gender,
+            age=age,
             condition=condition,
             total_videos=total_videos,
         )
 
         await create_video_sequence_for_participant(user.id, condition)
 
-        await message.reply_text(
-            "Спасибо! Общие данные записаны.\n\n"
-            "Теперь начнётся основная часть эксперимента: вам будет показано *4 видео*.\n\n"
-            "Для каждого видео:\n"
-            "• Посмотрите видео со звуком.\n"
-            "• Опишите, что делает робот.\n"
-            "• Вставьте два наречия (как он ведёт себя и как делает выбор).\n"
-            "• Оцените, какое из двух утверждений лучше описывает происходящее.\n\n"
-            "Начнём с первого видео.",
-            parse_mode="Markdown"
-        )
+        await message.reply_text(MARKDOWN_TEXTS["main_part_intro"], parse_mode="Markdown")
 
         context.user_data["stage"] = None
         await continue_experiment(update, context)
@@ -780,27 +1225,20 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
     # ---------- Блок ответов по видео ----------
-    participant = await get_participant(user_id)
-    if not participant or participant["completed"]:
-        await message.reply_text(
-            "Сессия эксперимента не найдена или уже завершена. Нажмите /start."
-        )
+    snapshot = await load_session_snapshot(user_id)
+    if not snapshot or snapshot.completed:
+        await message.reply_text(TEXTS["session_missing_or_done"])
         context.user_data.clear()
         return
 
-    idx = participant["current_video_idx"]
-    total = participant["total_videos"]
-    video_info = await get_video_by_position(user_id, idx)
+    idx = snapshot.current_video_idx
 
-    if not video_info:
-        await message.reply_text(
-            "Ошибка: не найдена информация о текущем видео. "
-            "Нажмите /start или обратитесь к организатору."
-        )
+    if not snapshot.has_video:
+        await message.reply_text(TEXTS["video_missing_contact"])
         return
 
-    scenario = video_info["scenario"]
-    file_id = video_info["file_id"]
+    scenario = snapshot.scenario
+    file_id = snapshot.file_id
 
     if stage == "expect_description":
         await upsert_answer_field(
@@ -812,11 +1250,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text,
         )
         context.user_data["stage"] = "expect_adv_behavior"
-        await message.reply_text(
-            "Спасибо.\n\n"
-            "3. Вставьте наречие вместо пробела.\n"
-            "Робот ведёт себя ____ (Как?)"
-        )
+        await message.reply_text(TEXTS["thanks_ask_adv_behavior"])
         return
 
     if stage == "expect_adv_behavior":
@@ -829,11 +1263,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text,
         )
         context.user_data["stage"] = "expect_adv_choice"
-        await message.reply_text(
-            "Спасибо.\n\n"
-            "4. Вставьте наречие вместо пробела.\n"
-            "Робот делает выбор ____ (Как?)"
-        )
+        await message.reply_text(TEXTS["thanks_ask_adv_choice"])
         return
 
 
@@ -847,18 +1277,14 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text,
         )
         context.user_data["stage"] = "expect_rating"
-        await continue_experiment(update, context)
+        await continue_experiment(update, context, replace(snapshot, adv_choice=text))
         return
 
     if stage == "expect_rating":
-        await message.reply_text(
-            "Пожалуйста, выберите число от 1 до 10, нажав на одну из кнопок под вопросом."
-        )
+        await message.reply_text(TEXTS["use_rating_buttons"])
         return
 
-    await message.reply_text(
-        "Похоже, произошла ошибка с определением шага. Нажмите /start, чтобы восстановить сессию."
-    )
+    await message.reply_text(TEXTS["stage_unknown"])
     context.user_data.clear()
 
 async def handle_gender_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -879,10 +1305,14 @@ async def handle_gender_choice(update: Update, context: ContextTypes.DEFAULT_TYP
         participant_name=context.user_data.get("participant_name"),
         gender=gender,
     )
-    await q.message.edit_text(
-        f"2️⃣/3️⃣ Вы указали пол: *{gender}*.\n\n3️⃣/3️⃣ — Укажите, пожалуйста, ваш возраст (числом):",
-        parse_mode="Markdown"
-    )
+    await q.message.edit_text(GENDER_CHOSEN[gender], parse_mode="Markdown")
+
+
+async def remove_reply_markup(q: CallbackQuery):
+    try:
+        await q.edit_message_reply_markup(reply_markup=None)
+    except BadRequest:
+        pass
 
 
 async def handle_likert(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -898,26 +1328,26 @@ async def handle_likert(update: Update, context: ContextTypes.DEFAULT_TYPE):
             raise ValueError
 
         user_id = q.from_user.id
-        participant = await get_participant(user_id)
+        snapshot = await load_session_snapshot(user_id)
 
-        if not participant or participant["completed"]:
-            await q.message.reply_text(
-                "Сессия эксперимента не найдена или уже завершена. Нажмите /start."
-            )
+        if not snapshot or snapshot.completed:
+            await q.message.reply_text(TEXTS["session_missing_or_done"])
             context.user_data.clear()
             return
 
-        idx = participant["current_video_idx"]
-        total = participant["total_videos"]
-        video_info = await get_video_by_position(user_id, idx)
-        if not video_info:
-            await q.message.reply_text(
-                "Ошибка: не найдена информация о текущем видео. Нажмите /start."
-            )
+        idx = snapshot.current_video_idx
+        total = snapshot.total_videos
+        if not snapshot.has_video:
+            await q.message.reply_text(TEXTS["video_missing_start"])
+            return
+
+        if snapshot.stage != "expect_rating":
+            # Повторное нажатие или кнопка под уже оценённым видео — оценка не нужна
+            await q.message.reply_text(TEXTS["already_answered"])
             return
 
-        scenario = video_info["scenario"]
-        file_id = video_info["file_id"]
+        scenario = snapshot.scenario
+        file_id = snapshot.file_id
 
         await upsert_answer_field(
             user_id,
@@ -928,39 +1358,33 @@ async def handle_likert(update: Update, context: ContextTypes.DEFAULT_TYPE):
             score,
         )
 
+        # Кнопки под оценённым вопросом убираются параллельно со следующим шагом:
+        # это правка старого сообщения, порядок новых сообщений от неё не зависит
+        keyboard_removed = asyncio.create_task(remove_reply_markup(q))
         try:
-            await q.edit_message_reply_markup(reply_markup=None)
-        except BadRequest:
-            pass
-
-        next_idx = idx + 1
-        if next_idx >= total:
-            await update_participant_progress(user_id, current_video_idx=next_idx, completed=True)
-            participant = await get_participant(user_id)
-            await send_final_message(update, participant)
-            context.user_data.clear()
-        else:
-            await update_participant_progress(user_id, current_video_idx=next_idx)
-            await q.message.reply_text("Спасибо! Переходим к следующему видео.")
-            context.user_data["stage"] = None
-            await continue_experiment(update, context)
+            next_idx = idx + 1
+            if next_idx >= total:
+                await update_participant_progress(user_id, current_video_idx=next_idx, completed=True)
+                await send_final_message(update, snapshot.participant)
+                context.user_data.clear()
+            else:
+                await update_participant_progress(user_id, current_video_idx=next_idx)
+                await q.message.reply_text(TEXTS["next_video"])
+                context.user_data["stage"] = None
+                await continue_experiment(update, context)
+        finally:
+            await keyboard_removed
 
     except BadRequest as e:
         msg = str(e).lower()
         logger.warning("BadRequest in handle_likert: %s", e)
         if "query is too old" in msg:
-            await q.message.reply_text(
-                "🕒 Эта кнопка устарела. Нажмите /start, чтобы восстановить сессию."
-            )
+            await q.message.reply_text(TEXTS["button_expired"])
         else:
-            await q.message.reply_text(
-                "⚠️ Возникла ошибка при обработке ответа. Нажмите /start, чтобы продолжить."
-            )
+            await q.message.reply_text(TEXTS["answer_error"])
     except Exception as e:
         logger.exception("Unexpected error in handle_likert: %s", e)
-        await q.message.reply_text(
-            "⚠️ Произошла неожиданная ошибка. Нажмите /start, чтобы продолжить."
-        )
+        await q.message.reply_text(TEXTS["unexpected_error"])
 
 
 async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -972,7 +1396,16 @@ async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message and message.video:
         await message.reply_text(f"Ваш file_id: {message.video.file_id}")
     else:
-        await message.reply_text("Пожалуйста, отправьте видео.")
+        await message.reply_text(TEXTS["send_video"])
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /stats — сводка для исследователей (только для BOT_ADMIN_IDS): сколько участников
+    начали и завершили эксперимент по условиям, средние и гистограммы оценок по сценариям.
+    """
+    summary = await load_dashboard_stats()
+    await update.message.reply_text(format_summary(summary, SCENARIOS))
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
@@ -985,7 +1418,7 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
             return
         await context.bot.send_message(
             chat_id=chat.id,
-            text="⚠️ Произошла ошибка. Пожалуйста, нажмите /start, чтобы продолжить.",
+            text=TEXTS["error"],
         )
     except Exception:
         logger.exception("Failed to notify user about error")
@@ -995,22 +1428,229 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
 #                                  MAIN
 # ---------------------------------------------------------------------------
 
-async def main():
-    await create_schema_and_fill()
+# Замки «по пользователю» для параллельной обработки апдейтов
+user_locks = PerUserLocks()
 
-    app = Application.builder().token(BOT_TOKEN).build()
+# Апдейты, не подошедшие ни одному обработчику
+dropped_updates = DroppedUpdates()
 
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CallbackQueryHandler(handle_gender_choice, pattern=r"^gender_"))
-    app.add_handler(CallbackQueryHandler(handle_likert, pattern=r"^likert_\d+$"))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+_stats_task: Optional[asyncio.Task] = None
+_metrics_server: Optional[MetricsServer] = None
+
+
+def runtime_stats(app: Application) -> Dict[str, Any]:
+    limiter = app.bot.rate_limiter
+    return {
+        "update_queue": app.update_queue.qsize(),
+        "handlers": user_locks.stats(),
+        "dropped_updates": dropped_updates.stats(),
+        "db_pool": db_pool.stats() if db_pool else None,
+        "answer_buffer": answer_buffer.stats() if answer_buffer else None,
+        "state_cache": state_cache_stats(),
+        "send_queue": limiter.stats() if isinstance(limiter, SendScheduler) else None,
+    }
+
+
+def render_metrics(app: Application) -> str:
+    return metrics.render_prometheus(gauges=flatten_numbers(runtime_stats(app)))
+
+
+async def _log_stats_periodically(app: Application):
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        logger.info("Статистика нагрузки: %s", runtime_stats(app))
+        logger.info("Метрики обработчиков: %s", metrics.summary())
+
+
+async def on_startup(app: Application):
+    global _stats_task, _metrics_server
+    if STATS_LOG_INTERVAL > 0:
+        _stats_task = asyncio.create_task(_log_stats_periodically(app))
+    if METRICS_PORT:
+        _metrics_server = MetricsServer(
+            lambda: render_metrics(app), host=METRICS_LISTEN, port=METRICS_PORT
+        )
+        await _metrics_server.start()
+
+
+async def on_shutdown(app: Application):
+    global _stats_task, _metrics_server
+    if _stats_task is not None:
+        _stats_task.cancel()
+        _stats_task = None
+    if _metrics_server is not None:
+        await _metrics_server.close()
+        _metrics_server = None
+    logger.info("Статистика нагрузки при остановке: %s", runtime_stats(app))
+    logger.info("Метрики обработчиков при остановке: %s", metrics.summary())
+    await close_answer_buffer()
+    await close_db_pool()
+
+
+def build_application(
+    token: str, request: Optional[BaseRequest] = None
+) -> Tuple[Application, List[str]]:
+    """
+    Собирает приложение со всеми обработчиками и возвращает его вместе со списком
+    allowed_updates. Пул БД к этому моменту уже должен быть открыт (init_db_pool).
+    request — подмена HTTP-клиента Bot API (используется в bench/load_test.py);
+    в любом случае он оборачивается InstrumentedRequest для подсчёта вызовов.
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(CONCURRENT_UPDATES if CONCURRENT_UPDATES > 1 else False)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if PERSISTENCE_MODE == "sqlite":
+        builder = builder.persistence(
+            SQLitePersistence(_pool(), update_interval=PERSISTENCE_INTERVAL)
+        )
+    elif PERSISTENCE_MODE != "none":
+        raise ValueError(f"Неизвестный режим сохранения состояния: {PERSISTENCE_MODE}")
+    if RATE_LIMIT == "on":
+        builder = builder.rate_limiter(
+            SendScheduler(
+                global_rate=RATE_GLOBAL_PER_SEC,
+                global_burst=RATE_GLOBAL_BURST,
+                chat_rate=RATE_CHAT_PER_SEC,
+                chat_burst=RATE_CHAT_BURST,
+                max_retries=RATE_MAX_RETRIES,
+                on_wait=lambda name, seconds: metrics.observe("send_queue", name, seconds),
+            )
+        )
+    elif RATE_LIMIT != "off":
+        raise ValueError(f"Неизвестный режим ограничения отправки: {RATE_LIMIT}")
+    # Запросы обработчиков к Bot API считаются в metrics; long polling (get_updates) — нет.
+    # Размер пула соединений — как у HTTPXRequest по умолчанию в ApplicationBuilder.
+    builder = builder.request(
+        InstrumentedRequest(request or HTTPXRequest(connection_pool_size=256), metrics)
+    )
+    app = builder.build()
+
+    def per_user(callback):
+        # Время обработчика замеряется уже после ожидания замка пользователя
+        return serialized_per_user(user_locks, metrics.wrap("handler", callback))
+
+    # Только новые сообщения: редактирование уже отправленного ответа не должно
+    # заново запускать шаг эксперимента
+    new_messages = filters.UpdateType.MESSAGE
+
+    app.add_handler(CommandHandler("start", per_user(start), filters=new_messages))
+    app.add_handler(CallbackQueryHandler(per_user(handle_gender_choice), pattern=r"^gender_"))
+    app.add_handler(CallbackQueryHandler(per_user(handle_likert), pattern=r"^likert_\d+$"))
+    app.add_handler(
+        MessageHandler(new_messages & filters.TEXT & ~filters.COMMAND, per_user(handle_text))
+    )
+
+    # Сводка для исследователей; остальным пользователям команда не отвечает
+    if ADMIN_IDS:
+        app.add_handler(
+            CommandHandler(
+                "stats", per_user(stats_command), filters=new_messages & filters.User(user_id=ADMIN_IDS)
+            )
+        )
 
     # Сервисный обработчик видео — для получения file_id
-    app.add_handler(MessageHandler(filters.VIDEO & ~filters.COMMAND, handle_video))
+    app.add_handler(
+        MessageHandler(new_messages & filters.VIDEO & ~filters.COMMAND, per_user(handle_video))
+    )
 
     app.add_error_handler(error_handler)
 
-    await app.run_polling(allowed_updates=Update.ALL_TYPES)
+    allowed_updates = allowed_updates_for(app)
+    logger.info("Запрашиваемые типы апдейтов: %s", allowed_updates)
+    dropped_updates.install(app)
+
+    return app, allowed_updates
+
+
+async def warm_up_videos(bot: Bot):
+    """
+    Проверяет file_id из VIDEO_FILES до приёма апдейтов (video_check.py). Если
+    какое-то видео заменено, новый file_id попадает в VIDEO_FILES, в таблицу
+    перестановок и в уже назначенные участникам строки video_sequence.
+    Если заменить видео нечем, VideoCheckError останавливает запуск.
+    """
+    global VIDEO_ORDER_TABLE
+
+    await bot.initialize()
+    files = await check_video_files(
+        bot, VIDEO_FILES, VIDEO_FALLBACK_DIR, VIDEO_UPLOAD_CHAT_ID, VIDEO_CHECK_CACHE_PATH
+    )
+    replaced = [
+        (condition, scenario, file_id)
+        for condition, scenarios in files.items()
+        for scenario, file_id in scenarios.items()
+        if VIDEO_FILES[condition][scenario] != file_id
+    ]
+    if not replaced:
+        return
+
+    async with _pool().writer() as db:
+        for condition, scenario, file_id in replaced:
+            VIDEO_FILES[condition][scenario] = file_id
+            await db.execute(
+                "UPDATE video_sequence SET file_id = ? WHERE condition = ? AND scenario = ? AND file_id != ?",
+                (file_id, condition, scenario, file_id),
+            )
+        await db.commit()
+    VIDEO_ORDER_TABLE = build_video_order_table()
+
+
+def check_run_mode():
+    """Проверка BOT_MODE до открытия БД и обращений к Telegram."""
+    if BOT_MODE not in ("polling", "webhook"):
+        raise ValueError(f"Неизвестный режим запуска: {BOT_MODE}")
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        raise ValueError(
+            "Для BOT_MODE=webhook задайте BOT_WEBHOOK_URL — внешний https-адрес вебхука, "
+            "например https://bot.example.org/telegram (Telegram не примет адрес вида http://0.0.0.0:8443)"
+        )
+
+
+async def main():
+    check_run_mode()
+    token = read_bot_token()
+
+    await create_schema_and_fill()
+    await init_db_pool()
+    init_answer_buffer()
+
+    app, allowed_updates = build_application(token)
+    if VIDEO_CHECK == "on":
+        try:
+            await warm_up_videos(app.bot)
+        except VideoCheckError as e:
+            logger.critical(f"❌ {e}")
+            raise
+    elif VIDEO_CHECK != "off":
+        raise ValueError(f"Неизвестный режим проверки видео: {VIDEO_CHECK}")
+    run_application(app, allowed_updates)
+
+
+def run_application(app: Application, allowed_updates: List[str]):
+    """Запускает приложение в выбранном режиме (BOT_MODE) и блокируется до остановки."""
+    # run_polling/run_webhook сами крутят текущий цикл событий (через nest_asyncio)
+    # и не должны закрывать его — им владеет asyncio.run() в __main__.
+    if BOT_MODE == "webhook":
+        logger.info(
+            "Запуск в режиме webhook: %s:%d/%s", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH
+        )
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            webhook_url=WEBHOOK_URL,
+            allowed_updates=allowed_updates,
+            close_loop=False,
+        )
+    elif BOT_MODE == "polling":
+        app.run_polling(allowed_updates=allowed_updates, close_loop=False)
+    else:
+        raise ValueError(f"Неизвестный режим запуска: {BOT_MODE}")
 
 
 if __name__ == "__main__":
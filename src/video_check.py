@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Проверка file_id видео при запуске бота.
+
+VIDEO_FILES хранит file_id видео на серверах Telegram. Если какой-то из них
+перестал действовать, без проверки ошибка проявится только у участника, который
+дошёл до этого видео. check_video_files() до запуска бота проверяет все file_id
+параллельно (getFile). Для недействительного file_id замена загружается из
+локального файла <fallback_dir>/<условие>/<сценарий>.mp4 в служебный чат
+(upload_chat_id), и бот берёт новый file_id из ответа.
+
+Замены кэшируются в JSON-файле cache_path: при следующем запуске проверяется уже
+file_id замены, и повторная загрузка не нужна, пока исходный file_id в VIDEO_FILES
+не изменится. Если заменить видео нечем, бросается VideoCheckError, и бот не
+запускается.
+
+Сетевые сбои и RetryAfter при проверке не означают, что file_id недействителен:
+запрос повторяется несколько раз, а если Telegram так и не ответил, в лог пишется
+предупреждение и используется file_id из настроек.
+"""
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from rate_limiter import BULK
+
+logger = logging.getLogger("experiment_bot.video_check")
+
+# Попытки getFile при сетевых сбоях и пауза перед повтором (растёт с номером попытки), с
+CHECK_ATTEMPTS = 3
+CHECK_BACKOFF = 1.0
+
+
+class VideoCheckError(RuntimeError):
+    """Есть недействительные file_id, для которых нет замены."""
+
+
+def fallback_path(fallback_dir: Path, condition: str, scenario: str) -> Path:
+    return fallback_dir / condition / f"{scenario}.mp4"
+
+
+async def file_id_error(bot: Bot, file_id: str) -> Optional[str]:
+    """
+    Текст ошибки Telegram для недействительного file_id или None, если он действителен
+    или проверить его не удалось из-за сетевых сбоев.
+    """
+    for attempt in range(1, CHECK_ATTEMPTS + 1):
+        try:
+            await bot.get_file(file_id)
+        except BadRequest as e:
+            # getFile не выдаёт файлы больше 20 МБ, но сам file_id при этом действителен
+            if "too big" in str(e).lower():
+                return None
+            return str(e)
+        except RetryAfter as e:
+            error, delay = e, float(e.retry_after)
+        except NetworkError as e:  # в том числе TimedOut
+            error, delay = e, CHECK_BACKOFF * attempt
+        else:
+            return None
+
+        if attempt == CHECK_ATTEMPTS:
+            logger.warning(
+                "file_id %s не проверен за %d попытки (%s), используется как есть", file_id, attempt, error
+            )
+            return None
+        await asyncio.sleep(delay)
+    return None
+
+
+def load_cache(path: Path) -> Dict[str, Dict[str, str]]:
+    """{"условие/сценарий": {"configured": file_id из VIDEO_FILES, "file_id": замена}}"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Кэш замен видео %s не прочитан, он будет создан заново: %s", path, e)
+        return {}
+
+
+def save_cache(path: Path, cache: Dict[str, Dict[str, str]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+async def upload_fallback(bot: Bot, chat_id: int, path: Path, title: str) -> str:
+    """Загружает локальное видео в служебный чат и возвращает его новый file_id."""
+    # Загрузка — фоновая отправка, она не должна обгонять ответы участникам
+    rate_limit = {"rate_limit_args": BULK} if getattr(bot, "rate_limiter", None) else {}
+    with open(path, "rb") as f:
+        message = await bot.send_video(
+            chat_id=chat_id,
+            video=f,
+            caption=f"Замена видео {title} (загружено ботом при проверке file_id)",
+            disable_notification=True,
+            write_timeout=300,
+            **rate_limit,
+        )
+    return message.video.file_id
+
+
+async def check_video_files(
+    bot: Bot,
+    files: Dict[str, Dict[str, str]],
+    fallback_dir: Path,
+    upload_chat_id: Optional[int],
+    cache_path: Path,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Проверяет file_id видео (условие -> сценарий -> file_id) и возвращает
+    действующие file_id в том же виде: исходные, замены из кэша или только что
+    загруженные замены. Бросает VideoCheckError, если заменить видео нечем.
+    """
+    cache = load_cache(cache_path)
+    # Замены для file_id, которых уже нет в VIDEO_FILES, не нужны
+    fresh_cache = {}
+    for key, entry in cache.items():
+        condition, _, scenario = key.partition("/")
+        if files.get(condition, {}).get(scenario) == entry.get("configured"):
+            fresh_cache[key] = entry
+
+    candidates: List[Tuple[str, str, str]] = []
+    for condition, scenarios in files.items():
+        for scenario, configured in scenarios.items():
+            entry = fresh_cache.get(f"{condition}/{scenario}")
+            candidates.append((condition, scenario, entry["file_id"] if entry else configured))
+
+    unique = sorted({file_id for _, _, file_id in candidates})
+    errors = dict(zip(unique, await asyncio.gather(*(file_id_error(bot, file_id) for file_id in unique))))
+
+    result: Dict[str, Dict[str, str]] = {condition: {} for condition in files}
+    problems: List[str] = []
+    for condition, scenario, file_id in candidates:
+        key = f"{condition}/{scenario}"
+        result[condition][scenario] = file_id
+        error = errors[file_id]
+        if error is None:
+            continue
+
+        path = fallback_path(fallback_dir, condition, scenario)
+        if upload_chat_id is None or not path.is_file():
+            reason = "нет чата для загрузки замены" if upload_chat_id is None else f"нет файла {path}"
+            problems.append(f"{key}: {error} ({reason})")
+            continue
+
+        new_file_id = await upload_fallback(bot, upload_chat_id, path, key)
+        logger.warning("file_id видео %s недействителен (%s), загружена замена из %s", key, error, path)
+        fresh_cache[key] = {"configured": files[condition][scenario], "file_id": new_file_id}
+        result[condition][scenario] = new_file_id
+
+    if fresh_cache != cache:
+        save_cache(cache_path, fresh_cache)
+    if problems:
+        raise VideoCheckError("Недействительные file_id видео без замены: " + "; ".join(problems))
+
+    replaced = sum(fid != files[c][s] for c, scenarios in result.items() for s, fid in scenarios.items())
+    logger.info("Проверено file_id видео: %d, используются замены: %d", len(unique), replaced)
+    return result